@@ -1,16 +1,8 @@
-import pandas as pd
 import time
 import os
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import logging
+from manifest_reader import load_manifest_keys, ManifestError
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +21,12 @@ class AWSDownloader:
     def setup_driver(self):
         """Configurar Chrome driver con opciones optimizadas"""
         logger.info("🔧 Configurando Chrome driver...")
+        # Selenium solo se importa al abrir el navegador
+        from selenium import webdriver
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
         
         chrome_options = Options()
         
@@ -62,61 +60,11 @@ class AWSDownloader:
         logger.info("✅ Chrome driver configurado correctamente")
         
     def load_files_from_csv(self):
-        """Cargar lista de archivos desde CSV"""
+        """Cargar lista de archivos desde CSV (lectura en streaming con caché binaria)"""
         logger.info(f"📁 Cargando archivos desde {self.csv_file}")
         
         try:
-            if self.csv_file.endswith('.csv'):
-                # Intentar múltiples estrategias de lectura
-                try:
-                    # Estrategia 1: Detectar separador automáticamente
-                    # Leer primera línea para detectar separador
-                    with open(self.csv_file, 'r', encoding='utf-8') as f:
-                        first_line = f.readline()
-                    
-                    # Detectar separador
-                    if ';' in first_line and first_line.count(';') > first_line.count(','):
-                        separator = ';'
-                        logger.info("🔍 Detectado separador: punto y coma (;)")
-                    else:
-                        separator = ','
-                        logger.info("🔍 Detectado separador: coma (,)")
-                    
-                    df = pd.read_csv(self.csv_file, sep=separator)
-                    
-                except Exception as e1:
-                    logger.warning(f"⚠️ Estrategia 1 falló: {e1}")
-                    try:
-                        # Estrategia 2: Forzar punto y coma
-                        df = pd.read_csv(self.csv_file, sep=';')
-                        logger.info("🔧 Usando separador forzado: punto y coma (;)")
-                    except Exception as e2:
-                        logger.warning(f"⚠️ Estrategia 2 falló: {e2}")
-                        try:
-                            # Estrategia 3: Forzar coma
-                            df = pd.read_csv(self.csv_file, sep=',')
-                            logger.info("🔧 Usando separador forzado: coma (,)")
-                        except Exception as e3:
-                            logger.warning(f"⚠️ Estrategia 3 falló: {e3}")
-                            # Estrategia 4: Con engine python (más lento pero más robusto)
-                            df = pd.read_csv(
-                                self.csv_file,
-                                engine='python',
-                                sep=None,  # Auto-detectar separador
-                                on_bad_lines='skip'
-                            )
-                            logger.info("🔧 Usando auto-detección de separador")
-            else:
-                df = pd.read_excel(self.csv_file)
-            
-            # Verificar columnas
-            logger.info(f"📋 Columnas encontradas: {list(df.columns)}")
-            
-            if 'file' not in df.columns:
-                logger.error(f"❌ No se encontró la columna 'file'. Columnas disponibles: {list(df.columns)}")
-                return []
-                
-            files = df['file'].dropna().unique().tolist()
+            files = load_manifest_keys(self.csv_file)
             logger.info(f"📊 Se encontraron {len(files)} archivos para descargar")
             
             # Mostrar algunas muestras para verificar
@@ -129,95 +77,11 @@ class AWSDownloader:
             
             return files
             
+        except ManifestError as e:
+            logger.error(f"❌ {e}")
+            return []
         except Exception as e:
             logger.error(f"❌ Error leyendo archivo CSV: {e}")
-            return self._read_csv_manual()
-    
-    def _read_csv_manual(self):
-        """Leer CSV manualmente línea por línea como backup"""
-        logger.info("🔧 Intentando lectura manual del CSV...")
-        
-        files = []
-        try:
-            with open(self.csv_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-            # Buscar la línea de headers y detectar separador
-            header_line = None
-            file_column_index = None
-            separator = ','
-            
-            for i, line in enumerate(lines[:10]):  # Buscar en las primeras 10 líneas
-                if 'file' in line.lower():
-                    header_line = i
-                    
-                    # Detectar separador
-                    if ';' in line and line.count(';') > line.count(','):
-                        separator = ';'
-                        logger.info("🔍 Separador detectado en lectura manual: punto y coma (;)")
-                    else:
-                        separator = ','
-                        logger.info("🔍 Separador detectado en lectura manual: coma (,)")
-                    
-                    headers = [h.strip().strip('"') for h in line.strip().split(separator)]
-                    if 'file' in headers:
-                        file_column_index = headers.index('file')
-                        break
-            
-            if file_column_index is None:
-                logger.error("❌ No se encontró la columna 'file' en el archivo")
-                return []
-            
-            logger.info(f"📍 Columna 'file' encontrada en posición {file_column_index}")
-            
-            # Leer los datos
-            for i, line in enumerate(lines[header_line + 1:], header_line + 2):
-                try:
-                    # Dividir la línea por el separador detectado
-                    if separator == ';':
-                        parts = [part.strip().strip('"') for part in line.strip().split(';')]
-                    else:
-                        # Para comas, manejar comillas
-                        parts = []
-                        current_part = ""
-                        inside_quotes = False
-                        
-                        for char in line.strip():
-                            if char == '"':
-                                inside_quotes = not inside_quotes
-                            elif char == ',' and not inside_quotes:
-                                parts.append(current_part.strip().strip('"'))
-                                current_part = ""
-                            else:
-                                current_part += char
-                        
-                        if current_part:
-                            parts.append(current_part.strip().strip('"'))
-                    
-                    # Extraer el archivo si hay suficientes columnas
-                    if len(parts) > file_column_index and parts[file_column_index].strip():
-                        file_name = parts[file_column_index].strip()
-                        if file_name and file_name != 'file':
-                            files.append(file_name)
-                
-                except Exception as e:
-                    logger.warning(f"⚠️ Error en línea {i}: {e}")
-                    continue
-            
-            # Eliminar duplicados
-            files = list(set(files))
-            logger.info(f"📊 Lectura manual completada: {len(files)} archivos únicos encontrados")
-            
-            # Mostrar ejemplos
-            if files:
-                logger.info(f"📄 Ejemplos de archivos encontrados:")
-                for i, file in enumerate(files[:3]):
-                    logger.info(f"  {i+1}. {file}")
-            
-            return files
-            
-        except Exception as e:
-            logger.error(f"❌ Error en lectura manual: {e}")
             return []
     
     def wait_for_user_navigation(self):
@@ -236,6 +100,10 @@ class AWSDownloader:
     
     def search_and_download_file(self, filename, file_number, total_files):
         """Buscar y descargar un archivo específico"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
+        
         try:
             print(f"\n🔍 PRUEBA ({file_number}/{total_files}): {filename}")
             print("   ⏳ Presiona Ctrl+C si quieres parar la prueba...")
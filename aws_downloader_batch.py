@@ -1,46 +1,179 @@
-import pandas as pd
 import time
 import os
 import json
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import logging
+import argparse
+from urllib.parse import quote, unquote, urlparse
+import copy
+import queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from progress_journal import ProgressJournal
+from state_store import StateStore, STATUS_DOWNLOADED
+from download_tracker import DownloadTracker
+from download_index import DownloadIndex
+from retry_scheduler import RetryScheduler, NegativeCache
+from rate_control import AIMDController, PrefixRateLimiter
+from lease_store import LeaseStore, shard_of, parse_shard
+from error_codes import (ERROR_NOT_FOUND, ERROR_SEARCH_BOX, ERROR_NO_DOWNLOAD_BUTTON, ERROR_TIMEOUT,
+                         ERROR_THROTTLED, ERROR_UNKNOWN, ERROR_INVALID_FILE, ERROR_SIZE_MISMATCH,
+                         ERROR_CHECKSUM_MISMATCH, ERROR_UNVERIFIABLE)
+from metrics import PhaseMetrics
+from selector_cache import SelectorResolver
+from prefix_planner import plan_prefix_groups
+from manifest_reader import load_manifest_keys, ManifestError
+import console_js
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Respuestas que indican que S3 o la consola piden bajar el ritmo
+CONGESTION_ERRORS = (ERROR_THROTTLED, ERROR_TIMEOUT)
+
+# Fallos transitorios que se reintentan con backoff; not_found es definitivo (caché negativa)
+RETRYABLE_ERRORS = (ERROR_SEARCH_BOX, ERROR_NO_DOWNLOAD_BUTTON, ERROR_TIMEOUT, ERROR_THROTTLED, ERROR_UNKNOWN,
+                    ERROR_INVALID_FILE, ERROR_SIZE_MISMATCH, ERROR_CHECKSUM_MISMATCH)
+
+# Subcarpeta de descargas donde se apartan los archivos inválidos antes de volver a pedirlos
+QUARANTINE_FOLDER = "_quarantine"
+
+# Selectores de la consola de S3, del más común a los alternativos
+SEARCH_BOX_XPATHS = [
+    "//input[contains(@placeholder, 'Buscar objetos') or contains(@placeholder, 'Search objects')]",
+    "//input[contains(@placeholder, 'buscar')]",
+    "//input[@type='text' and contains(@class, 'search')]",
+]
+FILE_LINK_XPATHS = [
+    "//a[contains(text(), '{filename}')]",
+    "//span[contains(text(), '{filename}')]/ancestor::a",
+    "//td[contains(text(), '{filename}')]/ancestor::tr//a",
+]
+DOWNLOAD_BUTTON_XPATHS = [
+    "//button[contains(text(), 'Descargar') or contains(text(), 'Download')]",
+    "//a[contains(text(), 'Descargar') or contains(text(), 'Download')]",
+    "//span[contains(text(), 'Descargar') or contains(text(), 'Download')]/ancestor::button",
+]
+
+# Resultado de los scripts del modo "js" -> código de error y mensaje
+JS_STATUS_ERRORS = {
+    "no_search_box": (ERROR_SEARCH_BOX, "❌ Campo búsqueda no encontrado"),
+    "not_found": (ERROR_NOT_FOUND, "⚠️ No encontrado"),
+    "no_download_button": (ERROR_NO_DOWNLOAD_BUTTON, "❌ Sin botón descarga"),
+}
+
+# Página de detalle de un objeto en la consola de S3 ({key} incluye el prefijo y va codificada)
+S3_CONSOLE_OBJECT_URL = "https://s3.console.aws.amazon.com/s3/object/{bucket}?region={region}&bucketType=general&prefix={key}"
+# Carpeta del bucket en la consola de S3 (donde se hacen las búsquedas)
+S3_CONSOLE_LISTING_URL = "https://s3.console.aws.amazon.com/s3/buckets/{bucket}?region={region}&bucketType=general&prefix={prefix}"
+
+# Ruta de chromedriver resuelta en este proceso (compartida por todas las sesiones del pool)
+_chromedriver_path = None
+
 class AWSDownloaderFast:
-    def __init__(self, csv_file="Informacion archivos cargados Ruta Costera.csv", download_folder="downloads", batch_size=1500):
+    def __init__(self, csv_file="Informacion archivos cargados Ruta Costera.csv", download_folder="downloads", batch_size=1500,
+                 engine="browser", s3_client=None, s3_prefix="", concurrency=1, state_db=None,
+                 metrics_csv=None, metrics_prom=None, start_url=None, headless=False,
+                 navigation="search", console_bucket=None, console_region="us-east-1",
+                 object_url_template=S3_CONSOLE_OBJECT_URL, group_by_prefix=False, prefix_length=20, max_group=30,
+                 executor="webdriver", capture_urls=False, capture_workers=8,
+                 selector_cache="selector_cache.json", unattended=False, profile_dir=None,
+                 session_file="browser_session.json", verify=False, verify_workers=None,
+                 max_attempts=3, not_found_ttl=7 * 24 * 3600, adaptive=True, prefix_rate=None,
+                 transfer_options=None, shard=None, lease_db=None, node_id=None, lease_ttl=600,
+                 sync=False, discover=False, inventory=None, inventory_filter=None):
         self.csv_file = csv_file
         self.download_folder = download_folder
         self.batch_size = batch_size
+        self.engine = engine  # "browser" (consola AWS con Selenium) o "s3" (API GetObject)
+        self.s3_client = s3_client
+        self.s3_prefix = s3_prefix
+        self.concurrency = max(1, concurrency)  # Transferencias simultáneas (o sesiones de Chrome) por tanda
+        # Con concurrencia > 1, el número en curso se ajusta con AIMD hasta `concurrency` según latencia y throttling
+        self.controller = AIMDController(self.concurrency) if adaptive and self.concurrency > 1 else None
+        # Ritmo por prefijo de clave (peticiones/s); sin `prefix_rate` solo se frenan los prefijos con throttling
+        self.rate_limiter = PrefixRateLimiter(prefix_rate, prefix_length)
+        self.browser_workers = []  # Sesiones de Chrome adicionales (modo navegador con concurrencia > 1)
+        self._idle_browsers = None
+        self.tracker = DownloadTracker(download_folder)  # Confirma que las descargas del navegador terminaron
+        self.download_index = None  # Índice de la carpeta de descargas (se abre al calcular lo pendiente)
+        # Reintentos con backoff para fallos transitorios; los no encontrados se recuerdan entre ejecuciones
+        self.retries = RetryScheduler(RETRYABLE_ERRORS, max_attempts=max_attempts)
+        self.not_found = NegativeCache(ttl=not_found_ttl)
+        self._retry_number = 0
+        # Ejecución repartida entre nodos: partición fija por hash (índice, total) y leases en una base compartida
+        self.shard = shard
+        self.leases = LeaseStore(lease_db, owner=node_id, ttl=lease_ttl) if lease_db else None
+        self._claimed = set()  # Claves que este nodo reclamó en esta ejecución
+        # Modo sync: lo pendiente sale de comparar el listado del bucket (ETag, tamaño) con el índice SQLite
+        self.sync = sync
+        self.discover = discover  # Incluir claves del prefijo que no están en el manifiesto
+        self.remote_meta = {}  # archivo -> metadatos remotos de lo que está en cola
+        self._uncounted = set()  # Claves en cola que no cuentan en progress['completed'] (aunque tuvieran éxito antes)
+        # Inventario de S3 como manifiesto: tamaño y ETag de cada clave sin listar el bucket
+        self.inventory = inventory
+        self.inventory_filter = inventory_filter
+        self.inventory_meta = {}  # archivo -> (tamaño, etag, last_modified) según el inventario
+        self.metrics = PhaseMetrics()  # Latencias por fase (compartidas con las sesiones del pool)
+        # Verificación de integridad (tamaño + MD5/ETag contra S3) en un pool de procesos
+        self.verifier = None
+        if verify:
+            from verifier import IntegrityVerifier
+            self.verifier = IntegrityVerifier(s3_client, s3_prefix, workers=verify_workers, metrics=self.metrics)
+        self.metrics_csv = metrics_csv
+        self.metrics_prom = metrics_prom
+        self.start_url = start_url  # Si se indica, se abre directamente sin esperar navegación manual
+        self.headless = headless
+        # Navegación en la consola: "search" (buscador) o "direct" (URL de detalle del objeto)
+        self.navigation = navigation
+        self.console_bucket = console_bucket
+        self.console_region = console_region
+        self.object_url_template = object_url_template
+        # Agrupación por prefijo: una búsqueda por grupo de archivos en lugar de una por archivo
+        self.group_by_prefix = group_by_prefix
+        self.prefix_length = prefix_length
+        self.max_group = max_group
+        self.known_keys = None  # Claves conocidas del bucket (ordenadas) para medir cuántos resultados da cada prefijo
+        self.listing_url = None  # Carpeta de S3 donde se hacen las búsquedas
+        # Ejecución del flujo por archivo: "webdriver" (un comando por paso) o "js" (scripts inyectados)
+        self.executor = executor
+        self.js_timeout_ms = 8000
+        self.selectors = SelectorResolver(selector_cache)  # Selector ganador por elemento, persistido entre ejecuciones
+        # Captura de URLs prefirmadas: Chrome solo las resuelve y los bytes van por un pool HTTP aparte
+        self.capture_urls = capture_urls
+        self.url_pool = None
+        if capture_urls:
+            from s3_transfer import PresignedDownloadPool
+            self.url_pool = PresignedDownloadPool(download_folder, workers=capture_workers, **(transfer_options or {}))
+        # Modo desatendido: un solo navegador para todas las tandas, sin pausas ni input()
+        self.unattended = unattended
+        self.profile_dir = profile_dir  # Perfil de Chrome persistente (mantiene la sesión de AWS entre ejecuciones)
+        self.session_file = session_file  # Última carpeta de S3 y ruta de chromedriver
         self.driver = None
         self.wait = None
         self.fast_wait = None  # Wait más rápido para elementos comunes
-        self.progress_file = "download_progress.json"
+        if state_db:
+            # Índice SQLite: manifiesto + estado por clave, consultas indexadas por estado
+            self.progress_file = state_db
+            self.state = StateStore(state_db)
+        else:
+            self.progress_file = "download_progress.jsonl"
+            self.state = ProgressJournal(self.progress_file, legacy_path="download_progress.json")
         
         # Crear carpeta de descarga
         Path(download_folder).mkdir(exist_ok=True)
         
     def load_progress(self):
         """Cargar progreso guardado"""
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'r') as f:
-                    progress = json.load(f)
+        try:
+            progress = self.state.load()
+            if progress is not None:
                 logger.info(f"📊 Progreso cargado: {progress['completed']}/{progress['total']} archivos completados")
                 return progress
-            except Exception as e:
-                logger.warning(f"⚠️ Error cargando progreso: {e}")
+        except Exception as e:
+            logger.warning(f"⚠️ Error cargando progreso: {e}")
         
         return {
             'completed': 0,
@@ -52,18 +185,68 @@ class AWSDownloaderFast:
             'start_time': datetime.now().isoformat()
         }
     
+    def record_result(self, progress, filename, success, error=None, duration=None, checksum=None):
+        """Registrar el resultado de un archivo en memoria y en el backend de progreso"""
+        previous = self.state.get_status(filename)
+        if success:
+            if previous is not True:
+                progress['successful_files'].append(filename)
+            # Una clave modificada en S3 ya tuvo éxito antes, pero salió de los terminados al volver a la cola
+            if previous is not True or filename in self._uncounted:
+                progress['completed'] += 1
+            self._uncounted.discard(filename)
+            if previous is False:
+                progress['failed_files'].remove(filename)
+        elif previous is not False:
+            if previous and filename in progress['successful_files']:
+                progress['successful_files'].remove(filename)  # Exitoso antes, pero el archivo resultó inválido
+            progress['failed_files'].append(filename)
+        size = None
+        if success:
+            dest_path = os.path.join(self.download_folder, filename)
+            if os.path.exists(dest_path):
+                size = os.path.getsize(dest_path)
+        try:
+            self.state.record(filename, success, error=error, size=size, duration=duration, checksum=checksum)
+        except Exception as e:
+            logger.error(f"❌ Error registrando progreso de {filename}: {e}")
+        meta = self.remote_meta.pop(filename, None) if success else None
+        if meta is not None:
+            self.state.set_remote([(filename, meta['etag'], meta['size'], meta['last_modified'])])
+        if self.leases is not None:
+            try:
+                # Descargado o inexistente: ningún nodo lo vuelve a pedir; otro fallo libera el lease
+                self.leases.complete(filename, done=success or error == ERROR_NOT_FOUND)
+            except Exception as e:
+                logger.error(f"❌ Error cerrando el lease de {filename}: {e}")
+    
+    def export_metrics(self):
+        """Escribir las latencias por fase en los archivos configurados"""
+        try:
+            if self.metrics_csv:
+                self.metrics.write_csv(self.metrics_csv)
+            if self.metrics_prom:
+                self.metrics.write_prometheus(self.metrics_prom)
+        except Exception as e:
+            logger.error(f"❌ Error exportando métricas: {e}")
+    
     def save_progress(self, progress):
-        """Guardar progreso actual"""
+        """Guardar progreso actual (registro de contadores en el diario, O(1))"""
         try:
             progress['last_update'] = datetime.now().isoformat()
-            with open(self.progress_file, 'w') as f:
-                json.dump(progress, f, indent=2)
+            self.state.checkpoint(progress)
         except Exception as e:
             logger.error(f"❌ Error guardando progreso: {e}")
     
     def setup_driver(self):
         """Configurar Chrome driver optimizado para velocidad"""
         logger.info("🔧 Configurando Chrome driver optimizado...")
+        # Selenium solo se importa cuando hace falta un navegador (status/plan y el motor s3 no lo cargan)
+        from selenium import webdriver
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from selenium.common.exceptions import SessionNotCreatedException
         
         chrome_options = Options()
         
@@ -94,68 +277,231 @@ class AWSDownloaderFast:
         chrome_options.add_argument("--disable-background-timer-throttling")
         chrome_options.add_argument("--disable-renderer-backgrounding")
         chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+        if self.headless:
+            chrome_options.add_argument("--headless=new")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
+        if self.capture_urls:
+            # Registrar eventos de red de DevTools para leer la URL prefirmada de cada descarga
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        
+        if self.profile_dir:
+            chrome_options.add_argument(f"--user-data-dir={os.path.abspath(self.profile_dir)}")
         
-        # Instalar y usar ChromeDriver automáticamente
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        # ChromeDriver resuelto una sola vez (y recordado entre ejecuciones)
+        try:
+            self.driver = webdriver.Chrome(service=Service(self._chromedriver_path()), options=chrome_options)
+        except SessionNotCreatedException as e:
+            # Chrome se actualizó y el chromedriver recordado ya no corresponde a su versión: se instala otro
+            logger.warning(f"⚠️ ChromeDriver incompatible con Chrome, se vuelve a instalar: {e.msg}")
+            self.driver = webdriver.Chrome(service=Service(self._chromedriver_path(refresh=True)),
+                                           options=chrome_options)
         
         # Configurar timeouts optimizados
         self.driver.set_page_load_timeout(15)  # Reducido de 30 a 15 segundos
         self.wait = WebDriverWait(self.driver, 8)  # Reducido de 20 a 8 segundos
         self.fast_wait = WebDriverWait(self.driver, 3)  # Wait rápido para elementos comunes
+        self.driver.set_script_timeout(self.js_timeout_ms / 1000 + 5)  # Scripts asíncronos del modo "js"
+        
+        if self.capture_urls:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            # Chrome no escribe el archivo: la descarga la hace el pool HTTP
+            self.driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "deny"})
         
         # Configurar script para evitar detección
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
         logger.info("✅ Chrome driver optimizado configurado")
         
+    def _load_browser_session(self):
+        """Leer el archivo de sesión del navegador ({} si no existe o está dañado)"""
+        try:
+            with open(self.session_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+    
+    def _save_browser_session(self, **fields):
+        """Actualizar campos del archivo de sesión del navegador"""
+        session = self._load_browser_session()
+        session.update(fields)
+        try:
+            with open(self.session_file, "w", encoding="utf-8") as f:
+                json.dump(session, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar la sesión del navegador: {e}")
+    
+    def _chromedriver_path(self, refresh=False):
+        """Ruta de chromedriver: se resuelve una vez por proceso y se reutiliza entre ejecuciones.
+
+        Con `refresh` se descarta la ruta recordada y webdriver_manager vuelve
+        a elegir el driver según la versión de Chrome instalada.
+        """
+        global _chromedriver_path
+        if refresh or _chromedriver_path is None:
+            cached = None if refresh else self._load_browser_session().get("chromedriver")
+            if cached and os.path.exists(cached):
+                _chromedriver_path = cached
+            else:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _chromedriver_path = ChromeDriverManager().install()
+                self._save_browser_session(chromedriver=_chromedriver_path)
+        return _chromedriver_path
+    
+    def restore_location_url(self):
+        """URL de la carpeta de S3 a la que volver sin intervención (None si no se conoce)"""
+        if self.start_url:
+            return self.start_url
+        saved = self._load_browser_session().get("listing_url")
+        if saved:
+            return saved
+        if self.console_bucket:
+            return S3_CONSOLE_LISTING_URL.format(bucket=self.console_bucket, region=self.console_region,
+                                                 prefix=quote(self.s3_prefix, safe=""))
+        return None
+    
+    def open_listing(self, batch_number, total_batches):
+        """Abrir la carpeta de S3 de trabajo: restaurándola en modo desatendido o con navegación manual"""
+        url = self.restore_location_url() if self.unattended else self.start_url
+        if url:
+            logger.info(f"📂 Abriendo ubicación de S3: {url}")
+            self.driver.get(url)
+            if "signin" in self.driver.current_url:
+                # Sin sesión de AWS válida (perfil nuevo o caducado): el inicio de sesión es manual
+                logger.warning("⚠️ La sesión de AWS no está iniciada en este perfil")
+                self.wait_for_user_navigation(batch_number, total_batches)
+        else:
+            self.driver.get("https://console.aws.amazon.com")
+            self.wait_for_user_navigation(batch_number, total_batches)
+        
+        self.listing_url = self.driver.current_url
+        self._save_browser_session(listing_url=self.listing_url)
+    
+    def close_browsers(self):
+        """Cerrar el pool y el navegador principal"""
+        if self._idle_browsers is not None:
+            self.stop_browser_pool()
+        if self.driver:
+            print("\n⏳ Cerrando navegador...")
+            self.driver.quit()
+            self.driver = None
+    
     def load_files_from_csv(self):
-        """Cargar lista de archivos desde CSV"""
+        """Cargar lista de archivos desde CSV (lectura en streaming con caché binaria)"""
         logger.info(f"📁 Cargando archivos desde {self.csv_file}")
         
         try:
-            if self.csv_file.endswith('.csv'):
-                # Detectar separador automáticamente
-                with open(self.csv_file, 'r', encoding='utf-8') as f:
-                    first_line = f.readline()
-                
-                if ';' in first_line and first_line.count(';') > first_line.count(','):
-                    separator = ';'
-                    logger.info("🔍 Detectado separador: punto y coma (;)")
-                else:
-                    separator = ','
-                    logger.info("🔍 Detectado separador: coma (,)")
-                
-                df = pd.read_csv(self.csv_file, sep=separator)
-            else:
-                df = pd.read_excel(self.csv_file)
-            
-            if 'file' not in df.columns:
-                logger.error(f"❌ No se encontró la columna 'file'. Columnas disponibles: {list(df.columns)}")
-                return []
-                
-            files = df['file'].dropna().unique().tolist()
+            files = load_manifest_keys(self.csv_file)
             logger.info(f"📊 Se encontraron {len(files)} archivos para descargar")
-            
             return files
             
+        except ManifestError as e:
+            logger.error(f"❌ {e}")
+            return []
         except Exception as e:
             logger.error(f"❌ Error leyendo archivo CSV: {e}")
             return []
     
+    def load_files_from_inventory(self):
+        """Cargar las claves desde un inventario de S3 (CSV.gz o Parquet), fila a fila, con su tamaño y ETag"""
+        logger.info(f"📁 Cargando inventario {self.inventory.location} ({self.inventory.file_format})")
+        
+        files = []
+        nested = 0
+        try:
+            for row in self.inventory.rows(self.inventory_filter):
+                name = row['key'][len(self.s3_prefix):]
+                if not name or "/" in name:
+                    nested += 1  # Subcarpetas: la carpeta de descargas es plana
+                    continue
+                if name in self.inventory_meta:
+                    continue
+                self.inventory_meta[name] = (row['size'], row['etag'], row['last_modified'])
+                files.append(name)
+        except ManifestError as e:
+            logger.error(f"❌ {e}")
+            return []
+        except Exception as e:
+            logger.error(f"❌ Error leyendo el inventario: {e}")
+            return []
+        
+        total_bytes = sum(meta[0] for meta in self.inventory_meta.values())
+        logger.info(f"📊 Se encontraron {len(files)} archivos para descargar ({total_bytes / 1024 ** 3:.2f} GB)"
+                    + (f", {nested} en subcarpetas omitidos" if nested else ""))
+        return files
+    
+    def load_manifest(self):
+        """Cargar las claves del manifiesto (desde el índice SQLite si el CSV no cambió)"""
+        if self.inventory is not None:
+            files = self.load_files_from_inventory()
+            if files and isinstance(self.state, StateStore):
+                self.state.import_manifest(self.inventory.location, files, signature=self.inventory.signature)
+            return self.shard_files(files)
+        if not isinstance(self.state, StateStore):
+            return self.shard_files(self.load_files_from_csv())
+        
+        files = self.state.cached_manifest(self.csv_file)
+        if files is not None:
+            logger.info(f"⚡ Manifiesto cargado desde {self.progress_file}: {len(files)} archivos")
+            return self.shard_files(files)
+        
+        files = self.load_files_from_csv()
+        if files:
+            self.state.import_manifest(self.csv_file, files)
+        return self.shard_files(files)
+    
+    def shard_files(self, files):
+        """Claves de este nodo con `--shard i/N`.
+
+        Sin leases se descarga solo la partición propia. Con leases se
+        empieza por la partición propia y después se sigue con las demás,
+        para recuperar las claves de un nodo caído (o que no arrancó) en
+        cuanto sus leases estén libres.
+        """
+        if not self.shard or not files:
+            return files
+        index, count = self.shard
+        own = [f for f in files if shard_of(f, count) == index]
+        logger.info(f"🧮 Shard {index}/{count}: {len(own)} de {len(files)} archivos")
+        if self.leases is None:
+            return own
+        own_set = set(own)
+        return own + [f for f in files if f not in own_set]
+    
     def get_downloaded_files(self):
-        """Obtener lista de archivos ya descargados de forma optimizada"""
-        downloaded = set()  # Usar set para búsquedas más rápidas
-        if os.path.exists(self.download_folder):
-            # Solo obtener nombres de archivos PDF
-            for filename in os.listdir(self.download_folder):
-                if filename.endswith('.pdf'):
-                    downloaded.add(filename)
-        logger.info(f"📁 Archivos ya descargados: {len(downloaded)}")
+        """Archivos completos en la carpeta de descargas, según el índice incremental"""
+        if self.download_index is None:
+            self.download_index = DownloadIndex(self.download_folder)
+        examined = self.download_index.refresh()
+        downloaded = self.download_index.valid_files()
+        logger.info(f"📁 Archivos ya descargados: {len(downloaded)} ({examined} nuevos examinados)")
         return downloaded
     
+    def quarantine_file(self, path):
+        """Mover un archivo descargado a la carpeta de cuarentena (deja de contar como descargado)"""
+        quarantine = os.path.join(self.download_folder, QUARANTINE_FOLDER)
+        Path(quarantine).mkdir(exist_ok=True)
+        if os.path.exists(path):
+            shutil.move(path, os.path.join(quarantine, os.path.basename(path)))
+        return quarantine
+    
+    def requeue_invalid_files(self, invalid, progress):
+        """Apartar en cuarentena los archivos vacíos o truncados y marcarlos como fallidos para volver a pedirlos"""
+        for filename in invalid:
+            quarantine = self.quarantine_file(os.path.join(self.download_folder, filename))
+            self.record_result(progress, filename, False, ERROR_INVALID_FILE)
+        logger.warning(f"⚠️ {len(invalid)} archivos vacíos o truncados movidos a {quarantine} para volver a descargarlos")
+    
+    def get_finished_files(self, all_files, downloaded_files):
+        """Archivos del manifiesto ya terminados: presentes en disco o registrados como exitosos.
+
+        Los éxitos sin confirmar en disco (p. ej. migrados del antiguo
+        download_progress.json) no vienen en `finished_files`: solo cuentan
+        si el archivo está en la carpeta.
+        """
+        recorded = self.state.finished_files()
+        return {f for f in all_files if f in downloaded_files or f in recorded}
+    
     def wait_for_user_navigation(self, batch_number, total_batches):
         """Esperar a que el usuario navegue manualmente a S3"""
         print("\n" + "="*80)
@@ -173,42 +519,169 @@ class AWSDownloaderFast:
         input("⏳ Presiona Enter cuando estés en la página correcta de S3...")
         logger.info(f"🚀 Iniciando descarga rápida de tanda {batch_number}/{total_batches}")
     
-    def search_and_download_file_fast(self, filename, file_number, batch_total, overall_progress):
-        """Versión optimizada para buscar y descargar archivos"""
-        start_time = time.time()
+    def _find_first(self, role, selectors, condition, **fields):
+        """Probar los selectores (el aprendido primero) y devolver el primer elemento encontrado.
+
+        Sin selector aprendido cada alternativa usa el wait rápido. Con uno
+        aprendido solo él espera: si ya no coincide, las alternativas se
+        comprueban sin espera (la página ya tuvo tiempo de cargar) y la que
+        encuentre el elemento pasa a ser el nuevo ganador.
+        """
+        from selenium.webdriver.common.by import By
         
-        try:
-            # Mostrar progreso más compacto
-            if file_number % 10 == 1 or file_number <= 5:  # Solo mostrar detalles cada 10 archivos o primeros 5
-                print(f"\n📥 ({file_number}/{batch_total}) - Total: {overall_progress['completed']+1}/{overall_progress['total']}")
-                print(f"🔍 {filename[:50]}...")
+        learned = self.selectors.winner(role, selectors)
+        for selector in self.selectors.ordered(role, selectors):
+            locator = (By.XPATH, selector.format(**fields))
+            try:
+                if learned is None or selector == learned:
+                    element = self.fast_wait.until(condition(locator))
+                else:
+                    element = condition(locator)(self.driver)
+            except Exception:
+                continue
+            if element:
+                self.selectors.learn(role, selector)
+                return element
+        return None
+    
+    def _find_search_box(self):
+        """Localizar el campo de búsqueda de objetos (None si no aparece)"""
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._find_first("search_box", SEARCH_BOX_XPATHS, EC.presence_of_element_located)
+    
+    def _find_file_link(self, filename):
+        """Localizar el enlace del archivo en los resultados de búsqueda (None si no aparece)"""
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._find_first("file_link", FILE_LINK_XPATHS, EC.element_to_be_clickable, filename=filename)
+    
+    def _find_download_button(self):
+        """Localizar el botón de descarga en la página del objeto (None si no aparece)"""
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._find_first("download_button", DOWNLOAD_BUTTON_XPATHS, EC.element_to_be_clickable)
+    
+    def _print_file_start(self, filename, file_number, batch_total, overall_progress):
+        """Mostrar progreso compacto del archivo que empieza"""
+        if file_number % 10 == 1 or file_number <= 5:  # Solo mostrar detalles cada 10 archivos o primeros 5
+            print(f"\n📥 ({file_number}/{batch_total}) - Total: {overall_progress['completed']+1}/{overall_progress['total']}")
+            print(f"🔍 {filename[:50]}...")
+        else:
+            # Progreso en línea compacto
+            print(f"📥 {file_number}/{batch_total}", end=" ", flush=True)
+    
+    def _download_from_object_page(self, filename, file_number, start_time, timer, go_back=True):
+        """Pulsar Descargar en la página de detalle del objeto abierta en el navegador"""
+        # OPTIMIZACIÓN 6: Buscar botón de descarga optimizado
+        download_button = self._find_download_button()
+        timer.lap("download_button_lookup")
+        if download_button:
+            self._before_download_click(filename)
+            download_button.click()
+            
+            # OPTIMIZACIÓN 7: Volver atrás en cuanto la descarga se entrega (a Chrome o al pool HTTP);
+            # el éxito se confirma después, cuando el archivo termina en disco
+            failure = self._after_download_click(filename, timer)
+            if failure:
+                print(f"❌ {failure.capitalize()}")
+                if go_back:
+                    self.driver.back()
+                return False, ERROR_TIMEOUT
+            if go_back:
+                self.driver.back()
+                time.sleep(0.5)  # Reducido de 2 a 0.5 segundos
+                timer.lap("navigate_back")
+            
+            elapsed = time.time() - start_time
+            if file_number % 10 == 1 or file_number <= 5:
+                print(f"✅ Descarga iniciada en {elapsed:.1f}s")
             else:
-                # Progreso en línea compacto
-                print(f"📥 {file_number}/{batch_total}", end=" ", flush=True)
+                print("✅", end=" ", flush=True)
             
-            # OPTIMIZACIÓN 1: Buscar campo de búsqueda con wait más rápido
-            search_box = None
+            return True, None
+        else:
+            print("❌ Sin botón descarga")
+            if go_back:
+                self.driver.back()
+                time.sleep(0.5)
+            return False, ERROR_NO_DOWNLOAD_BUTTON
+    
+    def _before_download_click(self, filename):
+        """Preparar la entrega de una descarga justo antes de pulsar Descargar"""
+        if self.capture_urls:
+            self.driver.get_log("performance")  # Descartar eventos de red anteriores
+        else:
+            self.tracker.expect(filename)
+    
+    def _capture_presigned_url(self, filename, timeout=5.0):
+        """Buscar en los eventos de red (DevTools) la URL prefirmada que pidió el botón Descargar"""
+        deadline = time.time() + timeout
+        delay = 0.05
+        while True:
+            for entry in self.driver.get_log("performance"):
+                message = json.loads(entry["message"])["message"]
+                if message.get("method") != "Network.requestWillBeSent":
+                    continue
+                url = message["params"]["request"]["url"]
+                if "X-Amz-Signature=" in url and unquote(urlparse(url).path).endswith(filename):
+                    return url
+            if time.time() >= deadline:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+    
+    def _after_download_click(self, filename, timer):
+        """Entregar la descarga: a Chrome (confirmada por el tracker) o al pool HTTP con la URL capturada.
+
+        Devuelve None si la descarga quedó en marcha o el motivo del fallo.
+        """
+        if not self.capture_urls:
+            started = self.tracker.wait_handoff(filename)
+            timer.lap("download_handoff")
+            if not started:
+                # El clic no inició ninguna descarga: se falla ya en lugar de esperar al tiempo límite del tracker
+                self.tracker.discard(filename)
+                return "la descarga no empezó"
+            return None
+        
+        url = self._capture_presigned_url(filename)
+        timer.lap("capture_url")
+        if not url:
+            return "sin URL prefirmada"
+        self.url_pool.submit(filename, url)
+        return None
+    
+    def _report_browser_error(self, e, file_number, start_time, go_back=True):
+        """Mostrar un error del navegador, volver atrás y devolver su código"""
+        from selenium.common.exceptions import TimeoutException
+        
+        elapsed = time.time() - start_time
+        if file_number % 10 == 1 or file_number <= 5:
+            print(f"❌ Error en {elapsed:.1f}s: {str(e)[:30]}...")
+        else:
+            print("❌", end=" ", flush=True)
+        if go_back:
             try:
-                # Intentar primero con el selector más común
-                search_box = self.fast_wait.until(
-                    EC.presence_of_element_located((By.XPATH, "//input[contains(@placeholder, 'Buscar objetos') or contains(@placeholder, 'Search objects')]"))
-                )
+                self.driver.back()
+                time.sleep(0.5)
             except:
-                # Fallback a selectores alternativos
-                search_selectors = [
-                    "//input[contains(@placeholder, 'buscar')]",
-                    "//input[@type='text' and contains(@class, 'search')]"
-                ]
-                for selector in search_selectors:
-                    try:
-                        search_box = self.fast_wait.until(EC.presence_of_element_located((By.XPATH, selector)))
-                        break
-                    except:
-                        continue
+                pass
+        return False, ERROR_TIMEOUT if isinstance(e, TimeoutException) else ERROR_UNKNOWN
+    
+    def search_and_download_file_fast(self, filename, file_number, batch_total, overall_progress):
+        """Versión optimizada para buscar y descargar archivos. Devuelve (éxito, código de error)"""
+        from selenium.webdriver.common.keys import Keys
+        
+        start_time = time.time()
+        timer = self.metrics.timer()
+        
+        try:
+            self._print_file_start(filename, file_number, batch_total, overall_progress)
             
+            # OPTIMIZACIÓN 1: Buscar campo de búsqueda con wait más rápido
+            search_box = self._find_search_box()
+            timer.lap("search_box_lookup")
             if not search_box:
                 print("❌ Campo búsqueda no encontrado")
-                return False
+                return False, ERROR_SEARCH_BOX
             
             # OPTIMIZACIÓN 2: Limpiar y buscar más rápido
             search_box.clear()
@@ -217,128 +690,606 @@ class AWSDownloaderFast:
             
             # OPTIMIZACIÓN 3: Espera reducida para resultados
             time.sleep(1.5)  # Reducido de 3 a 1.5 segundos
+            timer.lap("search")
             
             # OPTIMIZACIÓN 4: Buscar archivo con wait más rápido
-            file_link = None
-            try:
-                # Probar selector más directo primero
-                file_link = self.fast_wait.until(
-                    EC.element_to_be_clickable((By.XPATH, f"//a[contains(text(), '{filename}')]"))
-                )
-            except:
-                # Selectores alternativos
-                file_selectors = [
-                    f"//span[contains(text(), '{filename}')]/ancestor::a",
-                    f"//td[contains(text(), '{filename}')]/ancestor::tr//a"
-                ]
-                for selector in file_selectors:
-                    try:
-                        file_link = self.fast_wait.until(EC.element_to_be_clickable((By.XPATH, selector)))
-                        break
-                    except:
-                        continue
-            
+            file_link = self._find_file_link(filename)
+            timer.lap("result_lookup")
             if not file_link:
                 print("⚠️ No encontrado")
-                return False
+                return False, ERROR_NOT_FOUND
             
             # OPTIMIZACIÓN 5: Click y navegación más rápida
             file_link.click()
             time.sleep(1)  # Reducido de 3 a 1 segundo
+            timer.lap("result_click")
             
-            # OPTIMIZACIÓN 6: Buscar botón de descarga optimizado
-            download_button = None
-            try:
-                # Probar selectores más comunes primero
-                download_button = self.fast_wait.until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Descargar') or contains(text(), 'Download')]"))
-                )
-            except:
-                download_selectors = [
-                    "//a[contains(text(), 'Descargar') or contains(text(), 'Download')]",
-                    "//span[contains(text(), 'Descargar') or contains(text(), 'Download')]/ancestor::button"
-                ]
-                for selector in download_selectors:
-                    try:
-                        download_button = self.fast_wait.until(EC.element_to_be_clickable((By.XPATH, selector)))
-                        break
-                    except:
-                        continue
-            
-            if download_button:
-                download_button.click()
-                
-                # OPTIMIZACIÓN 7: Volver atrás más rápido
-                time.sleep(0.5)  # Reducido de 2 a 0.5 segundos
-                self.driver.back()
-                time.sleep(0.5)  # Reducido de 2 a 0.5 segundos
+            return self._download_from_object_page(filename, file_number, start_time, timer)
                 
-                elapsed = time.time() - start_time
-                if file_number % 10 == 1 or file_number <= 5:
-                    print(f"✅ Descargado en {elapsed:.1f}s")
-                else:
-                    print("✅", end=" ", flush=True)
-                
-                return True
+        except Exception as e:
+            return self._report_browser_error(e, file_number, start_time)
+    
+    def search_and_download_group(self, search_text, files, first_number, batch_total, overall_progress):
+        """Buscar un prefijo una sola vez y descargar cada archivo del grupo desde los resultados.
+
+        La consola de S3 no permite descargar varios objetos a la vez, así que
+        se recogen las URLs de detalle de los resultados y se abren una a una
+        sin volver a buscar. Devuelve [(archivo, éxito, error, duración)].
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.common.exceptions import TimeoutException
+        
+        results = []
+        group_start = time.time()
+        timer = self.metrics.timer()
+        
+        try:
+            # Volver a la carpeta de trabajo si la unidad anterior dejó abierta la página de un objeto
+            if self.listing_url and self.driver.current_url != self.listing_url:
+                self.driver.get(self.listing_url)
+            
+            search_box = self._find_search_box()
+            timer.lap("search_box_lookup")
+            if not search_box:
+                print("❌ Campo búsqueda no encontrado")
+                return [(f, False, ERROR_SEARCH_BOX, time.time() - group_start) for f in files]
+            
+            search_box.clear()
+            search_box.send_keys(search_text)
+            search_box.send_keys(Keys.ENTER)
+            time.sleep(1.5)
+            timer.lap("search")
+            
+            # Recoger las URLs de detalle de todos los resultados del prefijo
+            object_urls = {}
+            for link in self.driver.find_elements(By.XPATH, f"//a[contains(text(), '{search_text}')]"):
+                object_urls[link.text.strip()] = link.get_attribute("href")
+            timer.lap("result_lookup")
+        except Exception as e:
+            logger.warning(f"⚠️ Error buscando el prefijo {search_text[:30]}: {e}")
+            error = ERROR_TIMEOUT if isinstance(e, TimeoutException) else ERROR_UNKNOWN
+            return [(f, False, error, time.time() - group_start) for f in files]
+        
+        # El coste de la búsqueda se reparte entre los archivos del grupo
+        shared_time = (time.time() - group_start) / len(files)
+        
+        for offset, filename in enumerate(files):
+            file_number = first_number + offset
+            start_time = time.time()
+            file_timer = self.metrics.timer()
+            
+            url = object_urls.get(filename)
+            if not url:
+                # Fuera de la página de resultados del prefijo: no se da por inexistente sin buscarlo solo
+                try:
+                    if self.listing_url and self.driver.current_url != self.listing_url:
+                        self.driver.get(self.listing_url)
+                    success, error = self.search_and_download_file_fast(filename, file_number, batch_total,
+                                                                        overall_progress)
+                except Exception as e:
+                    success, error = self._report_browser_error(e, file_number, start_time, go_back=False)
             else:
-                print("❌ Sin botón descarga")
+                self._print_file_start(filename, file_number, batch_total, overall_progress)
+                try:
+                    self.driver.get(url)
+                    file_timer.lap("open_object_page")
+                    success, error = self._download_from_object_page(filename, file_number, start_time, file_timer, go_back=False)
+                except Exception as e:
+                    success, error = self._report_browser_error(e, file_number, start_time, go_back=False)
+            
+            duration = time.time() - start_time + shared_time
+            self.metrics.record("file_total", duration)
+            results.append((filename, success, error, duration))
+        
+        return results
+    
+    def _run_script(self, script, *args):
+        """Ejecutar un script asíncrono; si la página estaba navegando, reintentar una vez"""
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        
+        try:
+            return self.driver.execute_async_script(script, *args)
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            time.sleep(0.2)
+            return self.driver.execute_async_script(script, *args)
+    
+    def _js_failure(self, result, go_back):
+        """Convertir un resultado fallido de un script en (False, código de error)"""
+        error, message = JS_STATUS_ERRORS.get(result.get("status"), (ERROR_UNKNOWN, f"❌ Error JS: {result.get('message', '')[:30]}"))
+        print(message)
+        if go_back:
+            self.driver.back()
+        return False, error
+    
+    def _click_download_js(self, filename, file_number, start_time, timer, go_back=True, from_url=None):
+        """Pulsar Descargar con un único script y esperar a que Chrome reciba la descarga.
+
+        `from_url` es la página de resultados desde la que se abrió el objeto:
+        el botón no se busca hasta que la consola haya navegado fuera de ella.
+        """
+        self._before_download_click(filename)
+        result = self._run_script(console_js.CLICK_DOWNLOAD,
+                                  self.selectors.ordered("download_button", DOWNLOAD_BUTTON_XPATHS),
+                                  from_url, self.js_timeout_ms)
+        timer.lap("js_download_click")
+        if result.get("button_xpath"):
+            self.selectors.learn("download_button", result["button_xpath"])
+        if result.get("status") != "clicked":
+            self.tracker.discard(filename)
+            return self._js_failure(result, go_back)
+        
+        failure = self._after_download_click(filename, timer)
+        if failure:
+            print(f"❌ {failure.capitalize()}")
+            if go_back:
                 self.driver.back()
-                time.sleep(0.5)
-                return False
-                
+            return False, ERROR_TIMEOUT
+        if go_back:
+            # Sin pausa fija: el siguiente script espera al buscador con un MutationObserver
+            self.driver.back()
+            timer.lap("navigate_back")
+        
+        elapsed = time.time() - start_time
+        if file_number % 10 == 1 or file_number <= 5:
+            print(f"✅ Descarga iniciada en {elapsed:.1f}s")
+        else:
+            print("✅", end=" ", flush=True)
+        return True, None
+    
+    def search_and_download_file_js(self, filename, file_number, batch_total, overall_progress):
+        """Flujo por archivo con scripts inyectados (una petición por página en lugar de una por paso)"""
+        start_time = time.time()
+        timer = self.metrics.timer()
+        
+        try:
+            self._print_file_start(filename, file_number, batch_total, overall_progress)
+            
+            if self.navigation == "direct":
+                self.driver.get(self.object_console_url(filename))
+                timer.lap("open_object_page")
+                return self._click_download_js(filename, file_number, start_time, timer, go_back=False)
+            
+            # XPath concreto del archivo -> plantilla, para aprender qué alternativa coincidió
+            link_templates = {xpath.format(filename=filename): xpath
+                              for xpath in self.selectors.ordered("file_link", FILE_LINK_XPATHS)}
+            link_xpaths = list(link_templates)
+            result = self._run_script(console_js.SEARCH_AND_OPEN, filename,
+                                      self.selectors.ordered("search_box", SEARCH_BOX_XPATHS),
+                                      link_xpaths, self.js_timeout_ms)
+            if result.get("search_xpath"):
+                self.selectors.learn("search_box", result["search_xpath"])
+            if result.get("status") == "submitted":
+                # La búsqueda recargó la página: abrir el resultado con un segundo script
+                result = self._run_script(console_js.OPEN_RESULT, link_xpaths, self.js_timeout_ms)
+            timer.lap("js_search_open")
+            if result.get("link_xpath") in link_templates:
+                self.selectors.learn("file_link", link_templates[result["link_xpath"]])
+            if result.get("status") != "opened":
+                return self._js_failure(result, go_back=False)
+            
+            return self._click_download_js(filename, file_number, start_time, timer, from_url=result.get("from_url"))
+        except Exception as e:
+            return self._report_browser_error(e, file_number, start_time, go_back=self.navigation != "direct")
+    
+    def object_console_url(self, filename):
+        """URL de la página de detalle del objeto en la consola de S3"""
+        return self.object_url_template.format(
+            bucket=self.console_bucket,
+            region=self.console_region,
+            key=quote(self.s3_prefix + filename, safe=""),
+        )
+    
+    def open_and_download_file_direct(self, filename, file_number, batch_total, overall_progress):
+        """Abrir directamente la página del objeto (sin usar el buscador) y descargarlo"""
+        start_time = time.time()
+        timer = self.metrics.timer()
+        
+        try:
+            self._print_file_start(filename, file_number, batch_total, overall_progress)
+            self.driver.get(self.object_console_url(filename))
+            timer.lap("open_object_page")
+            return self._download_from_object_page(filename, file_number, start_time, timer, go_back=False)
+        except Exception as e:
+            return self._report_browser_error(e, file_number, start_time, go_back=False)
+    
+    def download_file_s3(self, filename, file_number, batch_total, overall_progress):
+        """Descargar un archivo directamente con la API de S3 (GetObject). Devuelve (éxito, código de error)"""
+        import requests
+        from s3_transfer import S3Error
+        
+        start_time = time.time()
+        verbose = file_number % 10 == 1 or file_number <= 5
+        self._print_file_start(filename, file_number, batch_total, overall_progress)
+        
+        try:
+            dest_path = os.path.join(self.download_folder, filename)
+            timer = self.metrics.timer()
+            size = self.s3_client.download_object(self.s3_prefix + filename, dest_path)
+            timer.lap("get_object")
+        except S3Error as e:
+            if e.status == 404:
+                print("⚠️ No encontrado")
+                return False, ERROR_NOT_FOUND
+            print(f"❌ Error S3: {str(e)[:40]}")
+            if e.status == 503 or e.code == "SlowDown":
+                return False, ERROR_THROTTLED
+            return False, ERROR_UNKNOWN
         except Exception as e:
             elapsed = time.time() - start_time
-            if file_number % 10 == 1 or file_number <= 5:
+            if verbose:
                 print(f"❌ Error en {elapsed:.1f}s: {str(e)[:30]}...")
             else:
                 print("❌", end=" ", flush=True)
+            return False, ERROR_TIMEOUT if isinstance(e, requests.Timeout) else ERROR_UNKNOWN
+        
+        elapsed = time.time() - start_time
+        if verbose:
+            print(f"✅ Descargado en {elapsed:.2f}s ({size/1024:.0f} KB)")
+        else:
+            print("✅", end=" ", flush=True)
+        return True, None
+    
+    def download_file(self, filename, file_number, batch_total, overall_progress):
+        """Descargar un archivo con el motor configurado"""
+        if self.engine == "s3":
+            return self.download_file_s3(filename, file_number, batch_total, overall_progress)
+        if self._idle_browsers is None:
+            return self.browser_download(filename, file_number, batch_total, overall_progress)
+        
+        # Tomar una sesión libre del pool; cada hilo trabaja con un navegador exclusivo
+        browser = self._idle_browsers.get()
+        try:
+            return browser.browser_download(filename, file_number, batch_total, overall_progress)
+        finally:
+            self._idle_browsers.put(browser)
+    
+    def download_group(self, search_text, files, first_number, batch_total, overall_progress):
+        """Descargar un grupo de archivos con prefijo común usando una sesión libre del navegador"""
+        if self._idle_browsers is None:
+            return self.search_and_download_group(search_text, files, first_number, batch_total, overall_progress)
+        
+        browser = self._idle_browsers.get()
+        try:
+            return browser.search_and_download_group(search_text, files, first_number, batch_total, overall_progress)
+        finally:
+            self._idle_browsers.put(browser)
+    
+    def browser_download(self, filename, file_number, batch_total, overall_progress):
+        """Descargar un archivo por la consola con el modo de navegación configurado"""
+        if self.executor == "js":
+            return self.search_and_download_file_js(filename, file_number, batch_total, overall_progress)
+        if self.navigation == "direct":
+            return self.open_and_download_file_direct(filename, file_number, batch_total, overall_progress)
+        return self.search_and_download_file_fast(filename, file_number, batch_total, overall_progress)
+    
+    def _copy_session_to(self, worker):
+        """Copiar las cookies de la sesión autenticada a otro navegador y abrir la misma ubicación"""
+        allowed = {"name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires"}
+        cookies = self.driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        cookie_params = []
+        for cookie in cookies:
+            param = {k: v for k, v in cookie.items() if k in allowed}
+            if cookie.get("session"):
+                param.pop("expires", None)
+            cookie_params.append(param)
+        worker.driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookie_params})
+        worker.driver.get(self.driver.current_url)
+    
+    def _browser_worker(self, download_folder):
+        """Sesión de Chrome adicional para el pool: solo su driver, su tracker y su carpeta de descarga.
+
+        Es una copia superficial de la principal, así que comparte la configuración
+        y los auxiliares de la ejecución (estado, métricas, selectores, pool HTTP)
+        en lugar de crear los suyos.
+        """
+        worker = copy.copy(self)
+        worker.download_folder = download_folder
+        worker.tracker = DownloadTracker(download_folder)
+        worker.profile_dir = None  # Chrome no abre dos sesiones sobre el mismo perfil
+        worker.driver = worker.wait = worker.fast_wait = None
+        worker.browser_workers = []
+        worker._idle_browsers = None
+        Path(download_folder).mkdir(exist_ok=True)
+        return worker
+    
+    def start_browser_pool(self):
+        """Abrir K-1 sesiones de Chrome adicionales que comparten la autenticación de la principal.
+
+        Cada sesión descarga en su propia subcarpeta para que las descargas no
+        colisionen; al terminar la tanda se mueven a la carpeta de descarga.
+        """
+        self._idle_browsers = queue.Queue()
+        self._idle_browsers.put(self)
+        
+        for n in range(2, self.concurrency + 1):
+            worker = self._browser_worker(os.path.join(self.download_folder, f"_browser_{n}"))
             try:
-                self.driver.back()
-                time.sleep(0.5)
-            except:
+                worker.setup_driver()
+                self._copy_session_to(worker)
+                worker.listing_url = self.listing_url
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo iniciar la sesión de Chrome {n}: {e}")
+                if worker.driver:
+                    worker.driver.quit()
+                continue
+            self.browser_workers.append(worker)
+            self._idle_browsers.put(worker)
+        
+        logger.info(f"🌐 Pool de navegadores listo: {len(self.browser_workers) + 1} sesiones")
+    
+    def local_path(self, filename):
+        """Ruta del archivo descargado: la carpeta principal o la de la sesión del pool que lo bajó"""
+        for browser in [self] + self.browser_workers:
+            path = os.path.join(browser.download_folder, filename)
+            if os.path.exists(path):
+                return path
+        return os.path.join(self.download_folder, filename)
+    
+    def collect_worker_downloads(self):
+        """Mover a la carpeta principal las descargas terminadas de las sesiones del pool"""
+        for worker in self.browser_workers:
+            for filename in os.listdir(worker.download_folder):
+                if filename.endswith(".crdownload"):
+                    continue  # Descarga incompleta: se reintentará en otra ejecución
+                shutil.move(os.path.join(worker.download_folder, filename),
+                            os.path.join(self.download_folder, filename))
+    
+    def stop_browser_pool(self):
+        """Cerrar las sesiones adicionales y mover sus descargas a la carpeta principal"""
+        for worker in self.browser_workers:
+            try:
+                worker.driver.quit()
+            except Exception:
                 pass
-            return False
+        self.collect_worker_downloads()
+        self.browser_workers = []
+        self._idle_browsers = None
+    
+    def _timed_download(self, filename, file_number, batch_total, progress):
+        """Descargar un archivo y devolver (éxito, código de error, duración)"""
+        start_time = time.time()
+        success, error = self.download_file(filename, file_number, batch_total, progress)
+        duration = time.time() - start_time
+        self.metrics.record("file_total", duration)
+        return success, error, duration
+    
+    def _plan_work_units(self, files_batch):
+        """Dividir la tanda en unidades de trabajo: [(número del primer archivo, texto a buscar, [archivos])].
+
+        Normalmente cada archivo es una unidad (texto a buscar None). Con
+        agrupación por prefijo, cada unidad es un grupo que comparte una sola búsqueda.
+        """
+        if self.engine == "browser" and self.group_by_prefix:
+            units = []
+            number = 1
+            for search_text, files in plan_prefix_groups(files_batch, self.prefix_length, self.max_group,
+                                                         known_keys=self.known_keys):
+                units.append((number, search_text, files))
+                number += len(files)
+            logger.info(f"🧩 {len(files_batch)} archivos agrupados en {len(units)} búsquedas por prefijo")
+            return units
+        if self.inventory_meta and self.concurrency > 1:
+            # Con los tamaños del inventario los objetos grandes empiezan primero y no alargan el final de la tanda
+            files_batch = sorted(files_batch, key=lambda f: -self.inventory_meta.get(f, (0,))[0])
+        return [(i, None, [filename]) for i, filename in enumerate(files_batch, 1)]
+    
+    def _run_work_unit(self, unit, batch_total, progress):
+        """Ejecutar una unidad de trabajo y devolver [(archivo, éxito, error, duración)]"""
+        first_number, search_text, files = unit
+        self.rate_limiter.acquire(self.s3_prefix + (search_text or files[0]))
+        if search_text is None:
+            filename = files[0]
+            return [(filename, *self._timed_download(filename, first_number, batch_total, progress))]
+        return self.download_group(search_text, files, first_number, batch_total, progress)
+    
+    def concurrency_limit(self):
+        """Unidades de trabajo que pueden estar en curso ahora mismo"""
+        return self.controller.limit if self.controller is not None else self.concurrency
+    
+    def observe_result(self, filename, success, error, duration):
+        """Ajustar la concurrencia y el ritmo del prefijo según el resultado de una descarga"""
+        key = self.s3_prefix + filename
+        if error in CONGESTION_ERRORS:
+            if error == ERROR_THROTTLED:
+                rate = self.rate_limiter.throttled(key)
+                logger.info(f"🚦 Throttling en {key[:40]}: prefijo limitado a {rate:.1f} peticiones/s")
+            if self.controller is not None and self.controller.on_congestion():
+                print(f"\n🐢 Concurrencia reducida a {self.controller.limit} ({error})")
+        elif success:
+            self.rate_limiter.succeeded(key)
+            if self.controller is not None:
+                self.controller.on_success(duration)
+    
+    def _next_unit(self, fresh_units, batch_total):
+        """Siguiente unidad de trabajo: primero los reintentos que ya vencieron, luego el trabajo nuevo"""
+        filename = self.retries.pop_due()
+        if filename is not None:
+            self._retry_number += 1
+            print(f"\n🔁 Reintento {self.retries.attempts[filename] + 1}/{self.retries.max_attempts}: {filename[:40]}")
+            return (batch_total + self._retry_number, None, [filename])
+        return next(fresh_units, None)
+    
+    def iter_downloads(self, files_batch, progress):
+        """Descargar los archivos de la tanda y devolver (archivo, éxito, error, duración) a medida que terminan.
+
+        Con concurrencia > 1 se mantienen hasta N unidades de trabajo en curso
+        en un pool de hilos; los resultados se consumen desde un único hilo,
+        que es el único que modifica `progress`. Los reintentos programados en
+        `self.retries` (por quien consume los resultados) se intercalan con el
+        trabajo nuevo en cuanto vence su espera.
+        """
+        batch_total = len(files_batch)
+        fresh_units = iter(self._plan_work_units(files_batch))
+        
+        if self.concurrency == 1:
+            while True:
+                unit = self._next_unit(fresh_units, batch_total)
+                if unit is None:
+                    delay = self.retries.next_due_in()
+                    if delay is None:
+                        return
+                    time.sleep(delay)  # Solo quedan reintentos en espera
+                    continue
+                for result in self._run_work_unit(unit, batch_total, progress):
+                    self.observe_result(*result)
+                    yield result
+        
+        in_flight = {}
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def fill():
+                while len(in_flight) < self.concurrency_limit():
+                    unit = self._next_unit(fresh_units, batch_total)
+                    if unit is None:
+                        return
+                    future = executor.submit(self._run_work_unit, unit, batch_total, progress)
+                    in_flight[future] = unit
+            
+            try:
+                fill()
+                while in_flight or self.retries.pending_count:
+                    if not in_flight:
+                        time.sleep(self.retries.next_due_in())  # Solo quedan reintentos en espera
+                        fill()
+                        continue
+                    
+                    # Despertar también cuando vence un reintento para no dejarlo esperando tras el trabajo en curso
+                    done, _ = wait(in_flight, timeout=self.retries.next_due_in(), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        unit = in_flight.pop(future)
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            logger.error(f"❌ Error inesperado descargando {unit[2][0]}: {e}")
+                            results = [(filename, False, ERROR_UNKNOWN, None) for filename in unit[2]]
+                        for result in results:
+                            self.observe_result(*result)
+                            yield result
+                    fill()
+            finally:
+                # Ctrl+C o cierre anticipado: no lanzar más trabajo
+                for future in in_flight:
+                    future.cancel()
+    
+    def poll_completed_downloads(self, wait=False):
+        """Resultados confirmados por los trackers de descarga del navegador (y de cada sesión del pool)"""
+        resolved = []
+        for browser in [self] + self.browser_workers:
+            resolved.extend(browser.tracker.wait_all() if wait else browser.tracker.poll())
+        if self.url_pool is not None:
+            resolved.extend(self.url_pool.wait_all() if wait else self.url_pool.poll())
+        for _, success, _, duration in resolved:
+            if success:
+                self.metrics.record("download_completion", duration)
+        return resolved
     
     def download_batch(self, files_batch, batch_number, total_batches, progress):
         """Descargar una tanda de archivos de forma optimizada"""
-        self.setup_driver()
+        if self.engine == "browser" and self.driver is None:
+            self.setup_driver()
+            fresh_browser = True
+        else:
+            fresh_browser = False  # Modo desatendido: el navegador sigue abierto desde la tanda anterior
         
         try:
-            # Abrir navegador y esperar navegación manual
-            self.driver.get("https://console.aws.amazon.com")
-            self.wait_for_user_navigation(batch_number, total_batches)
+            if self.engine == "browser":
+                if fresh_browser:
+                    self.open_listing(batch_number, total_batches)
+                elif self.driver.current_url != self.listing_url:
+                    self.driver.get(self.listing_url)
+                if self.concurrency > 1 and self._idle_browsers is None:
+                    self.start_browser_pool()
+            else:
+                logger.info(f"🚀 Descargando tanda {batch_number}/{total_batches} por API S3 (bucket: {self.s3_client.bucket})")
             
             batch_successful = 0
             batch_failed = 0
             batch_start_time = time.time()
             
-            print(f"\n🚀 Iniciando descarga de {len(files_batch)} archivos...")
+            mode = f"hasta {self.concurrency}, adaptativa" if self.controller is not None else self.concurrency
+            print(f"\n🚀 Iniciando descarga de {len(files_batch)} archivos (concurrencia: {mode})...")
             
-            # Procesar cada archivo en la tanda
-            for i, filename in enumerate(files_batch, 1):
-                success = self.search_and_download_file_fast(filename, i, len(files_batch), progress)
-                
+            handled = 0
+            self._retry_number = 0
+            
+            def finish_file(filename, success, error, duration, checksum=None):
+                nonlocal batch_successful, batch_failed, handled
                 if success:
                     batch_successful += 1
-                    progress['successful_files'].append(filename)
+                    self.not_found.discard(filename)
                 else:
                     batch_failed += 1
-                    progress['failed_files'].append(filename)
+                    if error == ERROR_NOT_FOUND:
+                        self.not_found.add(filename)  # No se vuelve a pedir hasta que caduque
+                self.record_result(progress, filename, success, error, duration, checksum)
                 
                 # Actualizar progreso
-                progress['completed'] += 1
                 progress['last_processed_file'] = filename
+                handled += 1
                 
                 # OPTIMIZACIÓN: Guardar progreso cada 5 archivos (en lugar de 10)
-                if progress['completed'] % 5 == 0:
+                if handled % 5 == 0:
                     self.save_progress(progress)
                     elapsed = time.time() - batch_start_time
-                    avg_time = elapsed / i
-                    remaining = len(files_batch) - i
+                    avg_time = elapsed / handled
+                    remaining = len(files_batch) - handled
                     eta = remaining * avg_time
                     print(f"\n💾 Progreso: {progress['completed']}/{progress['total']} | Promedio: {avg_time:.1f}s/archivo | ETA: {eta/60:.1f}min")
+            
+            def handle_result(filename, success, error, duration):
+                # Con verificación, una descarga terminada solo cuenta como exitosa tras comparar con S3
+                if success and self.verifier is not None:
+                    meta = self.inventory_meta.get(filename)
+                    self.verifier.submit(filename, os.path.abspath(self.local_path(filename)), duration,
+                                         expected=meta[:2] if meta else None)
+                elif not success and self.retries.schedule(filename, error):
+                    pass  # Fallo transitorio: vuelve a la cola con backoff
+                else:
+                    finish_file(filename, success, error, duration)
+            
+            def handle_verified(filename, ok, error, duration, checksum):
+                if not ok:
+                    # Un archivo sin verificar no se deja en la carpeta: la siguiente ejecución lo daría por terminado
+                    self.quarantine_file(self.local_path(filename))
+                    reason = "ya no existe en S3" if error == ERROR_NOT_FOUND else error
+                    print(f"\n🧪 {filename[:40]}: {reason}, movido a cuarentena")
+                elif ok and error == ERROR_UNVERIFIABLE:
+                    print(f"\n🧪 {filename[:40]}: ETag sin MD5 reproducible, solo se comprobó el tamaño")
+                if not ok and self.retries.schedule(filename, error):
+                    return
+                finish_file(filename, ok, error, duration, checksum)
+            
+            def drain(wait=False):
+                for result in self.poll_completed_downloads(wait=wait):
+                    handle_result(*result)
+                if self.verifier is not None:
+                    verified = self.verifier.wait_all() if wait else self.verifier.poll()
+                    for result in verified:
+                        handle_verified(*result)
+            
+            # Procesar cada archivo en la tanda; mientras haya descargas o verificaciones
+            # que terminen en un reintento, se vuelve a pasar por la cola de reintentos
+            work = files_batch
+            while True:
+                for filename, success, error, duration in self.iter_downloads(work, progress):
+                    # En modo navegador un éxito solo significa que Chrome recibió la descarga:
+                    # se registra cuando el tracker confirme el archivo terminado en disco
+                    if not (success and self.engine == "browser"):
+                        handle_result(filename, success, error, duration)
+                    drain()
+                    
+                    # OPTIMIZACIÓN: Sin pausa entre archivos (eliminada time.sleep(1))
                 
-                # OPTIMIZACIÓN: Sin pausa entre archivos (eliminada time.sleep(1))
+                if self.engine == "browser":
+                    print("\n⏳ Esperando a que terminen las descargas en curso...")
+                if self.engine == "browser" or self.verifier is not None:
+                    drain(wait=True)
+                if not self.retries.pending_count:
+                    break
+                work = []
             
             # Resumen de la tanda
             total_time = time.time() - batch_start_time
@@ -350,47 +1301,219 @@ class AWSDownloaderFast:
             print(f"Tiempo total: {total_time/60:.1f} minutos")
             print(f"Tiempo promedio: {avg_time:.1f} segundos/archivo")
             print(f"Total procesado: {progress['completed']}/{progress['total']}")
+            if self.controller is not None:
+                print(f"Concurrencia adaptativa: {self.controller.limit} en curso (máximo alcanzado {self.controller.peak}/{self.concurrency})")
             
             # Guardar progreso final de la tanda
             progress['current_batch'] = batch_number + 1
             self.save_progress(progress)
+            self.not_found.save()
+            self.export_metrics()
             
         except KeyboardInterrupt:
             print(f"\n⏹️ Descarga interrumpida por el usuario en tanda {batch_number}")
             self.save_progress(progress)
+            self.not_found.save()
             return False
             
         finally:
-            print("\n⏳ Cerrando navegador...")
-            if self.driver:
-                self.driver.quit()
+            if not self.unattended:
+                self.close_browsers()
+            elif self.browser_workers:
+                self.collect_worker_downloads()
         
         return True
     
+    def pending_files(self, progress, requeue=True):
+        """Devolver (manifiesto, archivos terminados, archivos pendientes en orden del manifiesto).
+
+        Los archivos vacíos o truncados nunca cuentan como terminados; con
+        `requeue` además se apartan en cuarentena (status y plan no tocan la carpeta).
+        """
+        all_files = self.load_manifest()
+        if not all_files:
+            return [], set(), []
+        
+        # Obtener archivos ya descargados para evitar duplicados (los truncados se vuelven a pedir)
+        downloaded_files = self.get_downloaded_files()
+        invalid_files = self.download_index.invalid_files().intersection(all_files)
+        if invalid_files and requeue:
+            self.requeue_invalid_files(sorted(invalid_files), progress)
+        if isinstance(self.state, StateStore):
+            self.state.mark_downloaded(f for f in all_files if f in downloaded_files)
+        
+        if self.sync:
+            all_files, remaining_files = self.sync_files(all_files, downloaded_files)
+            queued = set(remaining_files)
+            finished_files = {f for f in all_files if f not in queued and f not in self.not_found}
+        else:
+            # Reanudación por estado de cada archivo (no por número de tanda): un archivo
+            # está terminado si existe en la carpeta o si el diario lo registró como exitoso
+            finished_files = self.get_finished_files(all_files, downloaded_files) - invalid_files
+            remaining_files = [f for f in all_files if f not in finished_files]
+        
+        # Claves que S3 dio por inexistentes hace poco: no se vuelven a pedir hasta que caduquen
+        skipped = [f for f in remaining_files if f in self.not_found]
+        if skipped:
+            logger.info(f"🚫 {len(skipped)} archivos no encontrados recientemente se omiten (caché {self.not_found.path})")
+            skipped = set(skipped)
+            remaining_files = [f for f in remaining_files if f not in skipped]
+        if self.leases is not None:
+            remaining_files = self.leases.unfinished(remaining_files)  # Terminados por otros nodos
+        if self.engine == "browser" and self.group_by_prefix:
+            self.known_keys = sorted(all_files)  # Los ya descargados también salen en los resultados de la búsqueda
+        return all_files, finished_files, remaining_files
+    
+    def sync_files(self, all_files, downloaded_files):
+        """Comparar el listado del bucket con el índice y devolver (manifiesto, archivos nuevos o modificados).
+
+        Una clave entra en la cola si no tiene copia local, si su ETag o
+        tamaño cambió desde la última descarga o si el archivo local falta.
+        Un archivo ya presente sin metadatos en el índice (descargado antes
+        del modo sync) se adopta si su tamaño coincide. Las claves del
+        manifiesto que no aparecen en el listado van a la caché de no
+        encontrados sin pedirlas; con `discover` se añaden las claves del
+        prefijo que no están en el manifiesto.
+        """
+        manifest = set(all_files)
+        listed = set()
+        queued, discovered, adopted = [], [], []
+        changed = nested = 0
+        sizes = self.download_index.files
+        
+        for page in self.remote_pages():
+            objects = []
+            for obj in page:
+                name = obj['key'][len(self.s3_prefix):]
+                if not name or "/" in name:
+                    nested += 1  # Subcarpetas: la carpeta de descargas es plana
+                    continue
+                if name in manifest:
+                    listed.add(name)
+                elif not self.discover or (self.shard and self.leases is None
+                                           and shard_of(name, self.shard[1]) != self.shard[0]):
+                    continue
+                else:
+                    discovered.append(name)
+                objects.append((name, obj))
+            
+            known = self.state.remote_rows([name for name, _ in objects])
+            for name, obj in objects:
+                status, size, etag, _ = known.get(name, (None, None, None, None))
+                local = name in downloaded_files
+                if etag:
+                    if etag == obj['etag'] and size == obj['size']:
+                        if local and status == STATUS_DOWNLOADED:
+                            continue  # Sin cambios
+                    else:
+                        changed += 1
+                elif local and sizes[name][0] == obj['size']:
+                    adopted.append((name, obj['etag'], obj['size'], obj['last_modified']))
+                    continue
+                queued.append(name)
+                self.remote_meta[name] = obj
+                if self.inventory is None:
+                    self.not_found.discard(name)  # El listado manda: volvió a aparecer en el bucket
+            if adopted:
+                self.state.set_remote(adopted, downloaded=True)
+                adopted = []
+        
+        missing = [f for f in all_files if f not in listed]
+        for name in missing:
+            self.not_found.add(name)
+        self.not_found.save()
+        if discovered:
+            self.state.add_discovered(discovered)
+        
+        logger.info(f"🔄 Sync: {len(queued)} en cola ({changed} modificados), {len(missing)} del manifiesto no están "
+                    f"en el bucket, {len(discovered)} claves fuera del manifiesto"
+                    + (f", {nested} en subcarpetas omitidas" if nested else ""))
+        return all_files + discovered, queued
+    
+    def remote_pages(self, page_size=1000):
+        """Páginas de objetos remotos para sync: del inventario si se cargó uno, si no ListObjectsV2"""
+        if self.inventory is None:
+            yield from self.s3_client.list_objects(self.s3_prefix)
+            return
+        page = []
+        for name, (size, etag, last_modified) in self.inventory_meta.items():
+            page.append({"key": self.s3_prefix + name, "size": size, "etag": etag, "last_modified": last_modified})
+            if len(page) == page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+    
+    def print_status(self):
+        """Comando `status`: contadores del manifiesto y del estado, sin abrir navegador"""
+        progress = self.load_progress()
+        all_files, finished_files, remaining_files = self.pending_files(progress, requeue=False)
+        if not all_files:
+            return
+        
+        failed = [f for f in progress['failed_files'] if f not in finished_files]
+        print(f"\n📊 ESTADO ({self.progress_file}):")
+        print(f"Total archivos: {len(all_files)}")
+        print(f"Ya descargados: {len(finished_files)} ({len(finished_files) / len(all_files) * 100:.1f}%)")
+        print(f"Por descargar: {len(remaining_files)}")
+        print(f"Con intentos fallidos: {len(failed)}")
+        invalid = self.download_index.invalid_files().intersection(all_files)
+        if invalid:
+            print(f"Vacíos o truncados en disco (se volverán a pedir): {len(invalid)}")
+        not_found = [f for f in all_files if f not in finished_files and f in self.not_found]
+        if not_found:
+            print(f"No encontrados recientemente (se omiten hasta que caduque la caché): {len(not_found)}")
+        if isinstance(self.state, StateStore):
+            print("\n📋 Estado por clave:")
+            for status, count in sorted(self.state.counts().items()):
+                print(f"  {status}: {count}")
+        if self.leases is not None:
+            leases = self.leases.summary()
+            print(f"\n🤝 Leases ({self.leases.path}): {leases['done']} terminadas por algún nodo, "
+                  f"{leases['expired']} caducadas o liberadas")
+            for owner, count in sorted(leases['active'].items()):
+                print(f"  {owner}: {count} en curso")
+    
+    def print_plan(self):
+        """Comando `plan`: tandas que quedan por ejecutar y su tamaño, sin abrir navegador"""
+        progress = self.load_progress()
+        all_files, finished_files, remaining_files = self.pending_files(progress, requeue=False)
+        if not all_files:
+            return
+        
+        total_batches = (len(remaining_files) + self.batch_size - 1) // self.batch_size
+        print(f"\n📦 PLAN: {len(remaining_files)} archivos pendientes en {total_batches} tandas de hasta {self.batch_size}")
+        grouped = self.engine == "browser" and self.group_by_prefix
+        for batch_num in range(1, total_batches + 1):
+            files_batch = remaining_files[(batch_num - 1) * self.batch_size:batch_num * self.batch_size]
+            line = f"  Tanda {batch_num}: {len(files_batch)} archivos | ~{len(files_batch) * 4 / 60:.1f} min"
+            if self.inventory_meta:
+                batch_bytes = sum(self.inventory_meta[f][0] for f in files_batch if f in self.inventory_meta)
+                line += f" | {batch_bytes / 1024 ** 3:.2f} GB"
+            if grouped:
+                searches = len(plan_prefix_groups(files_batch, self.prefix_length, self.max_group,
+                                                  known_keys=self.known_keys))
+                line += f" | {searches} búsquedas por prefijo"
+            print(line)
+    
     def download_all_files(self):
         """Proceso principal de descarga por tandas optimizado"""
         # Cargar progreso previo
         progress = self.load_progress()
         
-        # Cargar todos los archivos
-        all_files = self.load_files_from_csv()
+        # Cargar todos los archivos (y separar los ya terminados)
+        all_files, finished_files, remaining_files = self.pending_files(progress)
         if not all_files:
             return
         
-        # Obtener archivos ya descargados para evitar duplicados
-        downloaded_files = self.get_downloaded_files()
-        
-        # OPTIMIZACIÓN: Usar set para filtrado más rápido
-        remaining_files = [f for f in all_files if f not in downloaded_files]
-        
-        # Si es la primera vez, inicializar progreso
-        if progress['total'] == 0:
-            progress['total'] = len(all_files)
-            progress['completed'] = len(downloaded_files)
+        # Contadores recalculados contra el manifiesto actual
+        progress['total'] = len(all_files)
+        progress['completed'] = len(finished_files)
+        self._uncounted = set(remaining_files)
         
         print(f"\n📊 ESTADO ACTUAL:")
         print(f"Total archivos: {len(all_files)}")
-        print(f"Ya descargados: {len(downloaded_files)}")
+        print(f"Ya descargados: {len(finished_files)}")
         print(f"Por descargar: {len(remaining_files)}")
         print(f"Tamaño de tanda: {self.batch_size}")
         
@@ -404,46 +1527,96 @@ class AWSDownloaderFast:
         print(f"📦 Total de tandas necesarias: {total_batches}")
         print(f"⏱️ Tiempo estimado total: {estimated_time:.1f} minutos")
         
-        current_batch = progress.get('current_batch', 1)
-        
-        # Procesar cada tanda
-        for batch_num in range(current_batch, total_batches + 1):
-            start_idx = (batch_num - 1) * self.batch_size
-            end_idx = min(start_idx + self.batch_size, len(remaining_files))
-            files_batch = remaining_files[start_idx:end_idx]
-            
-            print(f"\n🚀 INICIANDO TANDA {batch_num}/{total_batches}")
-            print(f"📁 Archivos en esta tanda: {len(files_batch)}")
-            estimated_batch_time = len(files_batch) * 4 / 60
-            print(f"⏱️ Tiempo estimado tanda: {estimated_batch_time:.1f} minutos")
-            
-            # Preguntar si continuar
-            if batch_num > 1:
-                response = input(f"\n¿Continuar con tanda {batch_num}? (s/n/q para salir): ").lower()
-                if response == 'n':
-                    print("⏸️ Pausando en esta tanda")
+        # Procesar cada tanda (las tandas se recalculan en cada ejecución sobre lo pendiente)
+        try:
+            for batch_num in range(1, total_batches + 1):
+                start_idx = (batch_num - 1) * self.batch_size
+                end_idx = min(start_idx + self.batch_size, len(remaining_files))
+                files_batch = remaining_files[start_idx:end_idx]
+                if self.leases is not None:
+                    files_batch = self.claim_batch(files_batch)
+                    if not files_batch:
+                        continue
+                
+                print(f"\n🚀 INICIANDO TANDA {batch_num}/{total_batches}")
+                print(f"📁 Archivos en esta tanda: {len(files_batch)}")
+                estimated_batch_time = len(files_batch) * 4 / 60
+                print(f"⏱️ Tiempo estimado tanda: {estimated_batch_time:.1f} minutos")
+                
+                # Preguntar si continuar (solo el modo navegador interactivo necesita intervención manual)
+                if batch_num > 1 and self.engine == "browser" and not self.unattended:
+                    response = input(f"\n¿Continuar con tanda {batch_num}? (s/n/q para salir): ").lower()
+                    if response == 'n':
+                        print("⏸️ Pausando en esta tanda")
+                        break
+                    elif response == 'q':
+                        print("🛑 Saliendo del programa")
+                        return
+                
+                # Descargar la tanda
+                success = self.download_batch(files_batch, batch_num, total_batches, progress)
+                
+                if not success:
+                    print(f"⚠️ Tanda {batch_num} interrumpida")
                     break
-                elif response == 'q':
-                    print("🛑 Saliendo del programa")
-                    return
-            
-            # Descargar la tanda
-            success = self.download_batch(files_batch, batch_num, total_batches, progress)
-            
-            if not success:
-                print(f"⚠️ Tanda {batch_num} interrumpida")
-                break
-            
-            print(f"✅ Tanda {batch_num} completada")
-            
-            # OPTIMIZACIÓN: Pausa reducida entre tandas
-            if batch_num < total_batches:
-                print(f"\n⏱️ Pausa de 10 segundos antes de la siguiente tanda...")
-                time.sleep(10)  # Reducido de 30 a 10 segundos
+                
+                print(f"✅ Tanda {batch_num} completada")
+                
+                # OPTIMIZACIÓN: Pausa reducida entre tandas (el modo desatendido reutiliza el navegador sin pausa)
+                if batch_num < total_batches and self.engine == "browser" and not self.unattended:
+                    print(f"\n⏱️ Pausa de 10 segundos antes de la siguiente tanda...")
+                    time.sleep(10)  # Reducido de 30 a 10 segundos
+            else:
+                if self.leases is not None:
+                    self.reclaim_expired(remaining_files, total_batches, progress)
+        finally:
+            if self.leases is not None:
+                self.leases.close()
+            self.close_browsers()
+            if self.url_pool is not None:
+                self.url_pool.shutdown()
+            if self.verifier is not None:
+                self.verifier.shutdown()
         
         # Resumen final
         self.print_final_summary(progress)
     
+    def claim_batch(self, files_batch):
+        """Reclamar en la base de leases las claves de la tanda que ningún otro nodo tiene"""
+        claimed = self.leases.claim(files_batch)
+        self._claimed.update(claimed)
+        if len(claimed) < len(files_batch):
+            print(f"\n🤝 {len(files_batch) - len(claimed)} archivos de la tanda ya están en manos de otros nodos o terminados")
+        return claimed
+    
+    def reclaim_expired(self, remaining_files, total_batches, progress):
+        """Al terminar lo propio, esperar a los demás nodos y recuperar las claves cuyos leases caducan.
+
+        Solo se recuperan claves que este nodo no intentó en esta ejecución;
+        termina cuando no queda ninguna sin terminar en manos de otro nodo.
+        """
+        batch_num = total_batches
+        while True:
+            candidates = [f for f in self.leases.unfinished(remaining_files) if f not in self._claimed]
+            if not candidates:
+                return
+            # Los primeros candidatos pueden seguir en manos de otro nodo: se sigue reclamando hasta llenar la tanda
+            files_batch = []
+            start = 0
+            while start < len(candidates) and len(files_batch) < self.batch_size:
+                chunk = candidates[start:start + self.batch_size - len(files_batch)]
+                start += len(chunk)
+                files_batch += self.leases.claim(chunk)
+            if not files_batch:
+                print(f"\n⏳ Esperando a otros nodos: {len(candidates)} archivos en curso")
+                time.sleep(min(self.leases.ttl / 3, 30))
+                continue
+            self._claimed.update(files_batch)
+            batch_num += 1
+            print(f"\n♻️ Recuperando {len(files_batch)} archivos con leases caducados")
+            if not self.download_batch(files_batch, batch_num, batch_num, progress):
+                return
+    
     def print_final_summary(self, progress):
         """Imprimir resumen final"""
         print("\n" + "="*80)
@@ -459,6 +1632,12 @@ class AWSDownloaderFast:
         
         print(f"📁 Carpeta de descarga: {os.path.abspath(self.download_folder)}")
         print(f"💾 Archivo de progreso: {self.progress_file}")
+        self.metrics.print_summary()
+        
+        if isinstance(self.state, StateStore):
+            print("\n📋 Estado por clave:")
+            for status, count in sorted(self.state.counts().items()):
+                print(f"  {status}: {count}")
         
         if progress['failed_files']:
             print(f"\n❌ Archivos que fallaron ({len(progress['failed_files'])}):")
@@ -469,8 +1648,8 @@ class AWSDownloaderFast:
         
         print("="*80)
 
-def main():
-    """Función principal"""
+def print_banner():
+    """Cabecera de la descarga"""
     print("⚡ AWS S3 File Downloader - VERSIÓN OPTIMIZADA")
     print("="*60)
     print("🚀 Optimizaciones:")
@@ -481,18 +1660,160 @@ def main():
     print("• ~3-5 segundos por archivo")
     print("• Mantiene todas las funcionalidades")
     print("="*60)
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Descarga masiva de archivos desde AWS S3 por tandas")
+    parser.add_argument("command", nargs="?", choices=["run", "sync", "status", "plan"], default="run",
+                        help="run: descargar (por defecto) | sync: solo lo nuevo o modificado en el bucket | "
+                             "status: contadores | plan: tandas pendientes")
+    parser.add_argument("--csv", default="Informacion archivos cargados Ruta Costera.csv", help="Archivo CSV/Excel con la columna 'file'")
+    parser.add_argument("--download-folder", default="downloads", help="Carpeta destino")
+    parser.add_argument("--batch-size", type=int, default=1500, help="Archivos por tanda")
+    parser.add_argument("--concurrency", type=int, default=1, help="Descargas simultáneas (motor s3) o sesiones de Chrome en paralelo (motor browser)")
+    parser.add_argument("--engine", choices=["browser", "s3"], default="browser",
+                        help="browser: consola AWS con Selenium | s3: API GetObject directa")
+    parser.add_argument("--bucket", help="Bucket S3 (requerido con --engine s3 o --navigation direct)")
+    parser.add_argument("--prefix", default="", help="Prefijo de las claves, p. ej. 'legalAspects/files/'")
+    parser.add_argument("--region", help="Región del bucket (por defecto AWS_REGION o us-east-1)")
+    parser.add_argument("--navigation", choices=["search", "direct"], default="search",
+                        help="Modo navegador: search (buscador de la consola) | direct (abrir la URL de cada objeto)")
+    parser.add_argument("--group-by-prefix", action="store_true",
+                        help="Modo navegador: buscar una vez por prefijo común y descargar todo el grupo")
+    parser.add_argument("--prefix-length", type=int, default=20, help="Longitud inicial del prefijo de agrupación")
+    parser.add_argument("--max-group", type=int, default=30, help="Máximo de archivos por búsqueda (una página de resultados)")
+    parser.add_argument("--executor", choices=["webdriver", "js"], default="webdriver",
+                        help="Modo navegador: webdriver (un comando por paso) | js (flujo completo en scripts inyectados)")
+    parser.add_argument("--capture-urls", action="store_true",
+                        help="Modo navegador: capturar la URL prefirmada de cada descarga (DevTools) y bajarla con un pool HTTP")
+    parser.add_argument("--capture-workers", type=int, default=8, help="Descargas HTTP simultáneas con --capture-urls")
+    parser.add_argument("--selector-cache", default="selector_cache.json",
+                        help="Archivo donde se recuerda qué selector de la consola funcionó")
+    parser.add_argument("--unattended", action="store_true",
+                        help="Modo navegador: un solo Chrome para todas las tandas, sin pausas ni confirmaciones")
+    parser.add_argument("--profile-dir", help="Perfil de Chrome persistente (conserva la sesión de AWS entre ejecuciones)")
+    parser.add_argument("--start-url", help="URL de la carpeta de S3 donde empezar (evita la navegación manual)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Verificar cada descarga (tamaño + MD5/ETag) contra S3; requiere --bucket y credenciales")
+    parser.add_argument("--verify-workers", type=int, help="Procesos de verificación (por defecto, uno por CPU)")
+    parser.add_argument("--part-size", type=int, default=8,
+                        help="MiB por rango: los objetos más grandes se descargan en rangos paralelos (motor s3 y --capture-urls)")
+    parser.add_argument("--part-workers", type=int, default=4, help="Rangos simultáneos para objetos grandes")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="Mantener siempre --concurrency en curso (sin ajuste AIMD por latencia y throttling)")
+    parser.add_argument("--prefix-rate", type=float,
+                        help="Peticiones por segundo por prefijo de clave (por defecto solo se frenan los prefijos con throttling)")
+    parser.add_argument("--shard", help="Partición de este nodo, i/N (p. ej. 0/4): reparto fijo de claves por hash")
+    parser.add_argument("--lease-db",
+                        help="Base SQLite compartida de leases (p. ej. en NFS) para repartir el trabajo entre nodos")
+    parser.add_argument("--node-id", help="Identificador de este nodo en los leases (por defecto, host-pid)")
+    parser.add_argument("--lease-ttl", type=float, default=600,
+                        help="Segundos tras los que caduca el lease de un nodo que dejó de renovarlo")
+    parser.add_argument("--discover", action="store_true",
+                        help="sync: descargar también las claves del prefijo que no están en el manifiesto")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="Intentos por archivo en cada ejecución (fallos transitorios, con backoff)")
+    parser.add_argument("--not-found-ttl", type=float, default=168,
+                        help="Horas durante las que no se vuelve a pedir un archivo no encontrado (0 = volver a pedirlo siempre)")
+    parser.add_argument("--inventory",
+                        help="manifest.json de un inventario de S3 (ruta local o s3://bucket/ruta/manifest.json) en lugar de --csv")
+    parser.add_argument("--min-size", type=int, help="Solo objetos de al menos estos bytes (con --inventory)")
+    parser.add_argument("--max-size", type=int, help="Solo objetos de hasta estos bytes (con --inventory)")
+    parser.add_argument("--modified-since", help="Solo objetos modificados desde esta fecha ISO, p. ej. 2024-01-31 (con --inventory)")
+    parser.add_argument("--modified-before", help="Solo objetos modificados antes de esta fecha ISO (con --inventory)")
+    parser.add_argument("--state-db", help="Guardar manifiesto y estado en una base SQLite (p. ej. download_state.db)")
+    parser.add_argument("--metrics-csv", help="Exportar p50/p95/p99 por fase a este CSV")
+    parser.add_argument("--metrics-prom", help="Exportar métricas por fase en formato textfile de Prometheus")
+    parser.add_argument("--endpoint-url", help="Endpoint compatible con S3 (p. ej. http://localhost:9000)")
+    args = parser.parse_args()
     
-    csv_file = "Informacion archivos cargados Ruta Costera.csv"
-    download_folder = "downloads"
-    batch_size = 1500
+    csv_file = args.csv
+    download_folder = args.download_folder
+    batch_size = args.batch_size
     
-    if not os.path.exists(csv_file):
+    inventory = inventory_filter = None
+    if args.inventory:
+        from inventory_reader import InventorySource, InventoryFilter
+        
+        def inventory_client(bucket):
+            from s3_transfer import S3Client
+            return S3Client.from_env(bucket, region=args.region, endpoint_url=args.endpoint_url)
+        
+        try:
+            inventory_filter = InventoryFilter(args.prefix, args.min_size, args.max_size,
+                                               args.modified_since, args.modified_before)
+            inventory = InventorySource(args.inventory, client_factory=inventory_client)
+        except ValueError as e:
+            parser.error(f"Fecha inválida: {e}")
+        except ManifestError as e:
+            print(f"❌ {e}")
+            return
+    elif any(v is not None for v in (args.min_size, args.max_size, args.modified_since, args.modified_before)):
+        parser.error("--min-size, --max-size, --modified-since y --modified-before requieren --inventory")
+    elif not os.path.exists(csv_file):
         print(f"❌ No se encontró el archivo: {csv_file}")
         return
     
+    s3_client = None
+    if args.engine == "browser" and args.navigation == "direct" and not args.bucket:
+        parser.error("--bucket es obligatorio con --navigation direct")
+    if args.engine == "s3" and not args.bucket:
+        parser.error("--bucket es obligatorio con --engine s3")
+    if args.group_by_prefix and args.engine == "browser":
+        # La búsqueda agrupada tiene su propio flujo (una búsqueda y las URLs de los resultados)
+        if args.executor == "js":
+            parser.error("--group-by-prefix no se puede combinar con --executor js")
+        if args.navigation == "direct":
+            parser.error("--group-by-prefix no se puede combinar con --navigation direct (ya abre cada objeto por URL)")
+    running = args.command in ("run", "sync")  # status y plan no necesitan cliente S3 ni navegador
+    if args.command == "sync":
+        if args.engine != "s3":
+            # Con el navegador, la copia vieja ocuparía el nombre y Chrome guardaría la nueva como "nombre (1).pdf"
+            parser.error("sync requiere --engine s3 (reemplaza en el sitio los archivos modificados)")
+        if not args.state_db:
+            args.state_db = "download_state.db"  # Los ETag de la última descarga se guardan en el índice SQLite
+            logger.info(f"🗄️ sync usa el índice SQLite {args.state_db} (--state-db para cambiarlo)")
+    if args.verify and not (args.bucket or args.inventory):
+        parser.error("--bucket es obligatorio con --verify (salvo con --inventory, que ya trae tamaño y ETag)")
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    # Descargas por rangos (reanudables, en paralelo para objetos grandes)
+    transfer_options = {"part_size": args.part_size * 1024 * 1024, "part_workers": args.part_workers}
+    if (args.engine == "s3" or args.verify or args.command == "sync") and running and args.bucket:
+        from s3_transfer import S3Client
+        s3_client = S3Client.from_env(args.bucket, region=args.region, endpoint_url=args.endpoint_url,
+                                      **transfer_options)
+    
     # Crear downloader optimizado
-    downloader = AWSDownloaderFast(csv_file, download_folder, batch_size)
-    downloader.download_all_files()
+    downloader = AWSDownloaderFast(csv_file, download_folder, batch_size,
+                                   engine=args.engine, s3_client=s3_client, s3_prefix=args.prefix,
+                                   concurrency=args.concurrency, state_db=args.state_db,
+                                   metrics_csv=args.metrics_csv, metrics_prom=args.metrics_prom,
+                                   navigation=args.navigation, console_bucket=args.bucket,
+                                   console_region=args.region or "us-east-1",
+                                   group_by_prefix=args.group_by_prefix, prefix_length=args.prefix_length,
+                                   max_group=args.max_group, executor=args.executor,
+                                   capture_urls=args.capture_urls and running, capture_workers=args.capture_workers,
+                                   selector_cache=args.selector_cache, unattended=args.unattended,
+                                   profile_dir=args.profile_dir, start_url=args.start_url,
+                                   verify=args.verify and running, verify_workers=args.verify_workers,
+                                   max_attempts=args.max_attempts, not_found_ttl=args.not_found_ttl * 3600,
+                                   adaptive=not args.fixed_concurrency, prefix_rate=args.prefix_rate,
+                                   transfer_options=transfer_options, shard=shard, lease_db=args.lease_db,
+                                   node_id=args.node_id, lease_ttl=args.lease_ttl,
+                                   sync=args.command == "sync", discover=args.discover,
+                                   inventory=inventory, inventory_filter=inventory_filter)
+    if args.command == "status":
+        downloader.print_status()
+    elif args.command == "plan":
+        downloader.print_plan()
+    else:
+        print_banner()
+        downloader.download_all_files()
 
 if __name__ == "__main__":
     main()
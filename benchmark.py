@@ -0,0 +1,413 @@
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import logging
+import argparse
+import statistics
+import subprocess
+import tempfile
+import threading
+import tracemalloc
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote, unquote
+
+logger = logging.getLogger(__name__)
+
+BUCKET = "bench-bucket"
+
+
+def synthetic_keys(count, records=50):
+    """Nombres tipo base64 como los del manifiesto real (prefijos compartidos por registro y fecha)"""
+    keys = []
+    for i in range(count):
+        record = 4000 + i % records
+        raw = f"{record}2025-05-05 15:57:{i // 60 % 60:02d}{i:07d}"
+        keys.append(base64.b64encode(raw.encode()).decode() + ".pdf")
+    return keys
+
+
+def synthetic_body(key, size):
+    """Contenido determinista de un objeto: cabecera PDF + relleno"""
+    header = f"%PDF-1.4\n% {key}\n".encode()
+    filler = hashlib.sha256(key.encode()).digest() * (size // 32 + 1)
+    body = header + filler
+    return body[:max(size - 6, len(header))] + b"\n%%EOF"
+
+
+class FakeAWSHandler(BaseHTTPRequestHandler):
+    """Consola S3 falsa (búsqueda, resultados, botón Download) y endpoint de objetos S3.
+
+    - /console?q=...              -> campo "Search objects" y enlaces a los resultados
+    - /console/object/<clave>     -> página del objeto con botón Download
+    - /s3/<bucket>/<clave>        -> GetObject/HeadObject (direccionamiento por ruta)
+    """
+
+    server_version = "FakeS3/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None, send_body=True):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _object_meta(self, key):
+        """(tamaño, md5) de un objeto, calculado una sola vez"""
+        config = self.server.config
+        meta = config["meta"].get(key)
+        if meta is None:
+            body = synthetic_body(key, config["object_size"])
+            meta = config["meta"][key] = (len(body), hashlib.md5(body).hexdigest())
+        return meta
+
+    def _list_objects(self, query, send_body=True):
+        """ListObjectsV2 con prefijo y paginación por continuation-token"""
+        config = self.server.config
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        start = int(query.get("continuation-token", ["0"])[0])
+        keys = [k for k in config["keys"] if k.startswith(prefix)]
+        page = keys[start:start + max_keys]
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><LastModified>2025-05-05T15:57:00.000Z</LastModified>"
+            f"<ETag>&quot;{self._object_meta(k)[1]}&quot;</ETag><Size>{self._object_meta(k)[0]}</Size></Contents>"
+            for k in page
+        )
+        truncated = start + max_keys < len(keys)
+        token = f"<NextContinuationToken>{start + max_keys}</NextContinuationToken>" if truncated else ""
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                f'<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f'<Name>{BUCKET}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>'
+                f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>{token}{contents}</ListBucketResult>')
+        self._send(200, body.encode(), "application/xml", send_body=send_body)
+
+    def _apply_range(self, body, headers):
+        """Cabeceras Range / If-Match / If-Range de GetObject; devuelve (estado, cuerpo)"""
+        range_header = self.headers.get("Range", "")
+        if not range_header.startswith("bytes="):
+            return 200, body
+        if_match = self.headers.get("If-Match")
+        if if_match and if_match != headers["ETag"]:
+            return 412, None
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range != headers["ETag"]:
+            return 200, body  # El objeto cambió: se devuelve entero
+        first, _, last = range_header[len("bytes="):].partition("-")
+        start = int(first)
+        if start >= len(body):
+            return 416, None
+        end = min(int(last), len(body) - 1) if last else len(body) - 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        return 206, body[start:end + 1]
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        config = self.server.config
+        if config["latency"]:
+            time.sleep(config["latency"])
+
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+
+        if path == "/console":
+            query = parse_qs(parsed.query).get("q", [""])[0]
+            results = [k for k in config["keys"] if query and query in k][:50]
+            links = "".join(f'<tr><td><a href="/console/object/{quote(k)}">{escape(k)}</a></td></tr>' for k in results)
+            page = (f'<html><body><form action="/console" method="get">'
+                    f'<input type="text" class="search" name="q" placeholder="Search objects" value="{escape(query)}">'
+                    f'</form><table>{links}</table></body></html>')
+            self._send(200, page.encode(), send_body=send_body)
+
+        elif path.startswith("/console/object/"):
+            key = path[len("/console/object/"):]
+            page = (f'<html><body><h1>{escape(key)}</h1>'
+                    f'<form action="/s3/{BUCKET}/{quote(key)}" method="get">'
+                    f'<input type="hidden" name="X-Amz-Signature" value="bench">'  # Simula la URL prefirmada
+                    f'<button type="submit">Download</button></form>'
+                    f'</body></html>')
+            self._send(200, page.encode(), send_body=send_body)
+
+        elif path.startswith(f"/s3/{BUCKET}/"):
+            key = path[len(f"/s3/{BUCKET}/"):]
+            if not key:
+                self._list_objects(parse_qs(parsed.query), send_body)
+                return
+            if send_body and not self.server.admit(key):
+                self._send(503, b"<Error><Code>SlowDown</Code></Error>", "application/xml")
+                return
+            if key not in config["key_set"]:
+                self._send(404, b"<Error><Code>NoSuchKey</Code></Error>", "application/xml", send_body=send_body)
+                return
+            meta = config["meta"].get(key)
+            if send_body or meta is None:
+                body = synthetic_body(key, config["object_size"])
+                meta = config["meta"][key] = (len(body), hashlib.md5(body).hexdigest())
+            headers = {
+                "ETag": f'"{meta[1]}"',
+                "Content-Disposition": f'attachment; filename="{key}"',
+            }
+            if send_body:
+                status, body = self._apply_range(body, headers)
+                if status >= 400:
+                    self._send(status, b"<Error><Code>PreconditionFailed</Code></Error>", "application/xml")
+                    return
+                self._send(status, body, "application/pdf", headers)
+            else:
+                # HEAD: tamaño y ETag ya calculados, sin regenerar el cuerpo
+                headers["Content-Length"] = str(meta[0])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+        else:
+            self._send(404, b"not found", "text/plain", send_body=send_body)
+
+
+class FakeAWSServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Con el backlog por defecto (5) la concurrencia alta provoca reintentos de SYN
+
+    def admit(self, key):
+        """Límite simulado de GETs por segundo y prefijo; False -> 503 SlowDown"""
+        limit = self.config["slowdown_rps"]
+        if not limit:
+            return True
+        now = time.monotonic()
+        prefix = key[:20]
+        with self.config["rate_lock"]:
+            window = [t for t in self.config["recent"].get(prefix, []) if now - t < 1.0]
+            admitted = len(window) < limit
+            if admitted:
+                window.append(now)
+            else:
+                self.config["slowdowns"] += 1
+            self.config["recent"][prefix] = window
+        return admitted
+
+
+def start_fake_server(keys, object_size=64 * 1024, latency=0.0, port=0, slowdown_rps=0):
+    """Arrancar el servidor falso en un hilo; devuelve (servidor, url base)"""
+    server = FakeAWSServer(("127.0.0.1", port), FakeAWSHandler)
+    server.config = {
+        "keys": keys,
+        "key_set": set(keys),
+        "object_size": object_size,
+        "latency": latency,
+        "meta": {},  # clave -> (tamaño, md5) para responder HEAD sin regenerar el cuerpo
+        "slowdown_rps": slowdown_rps,
+        "recent": {},  # prefijo -> momentos de los GET del último segundo
+        "rate_lock": threading.Lock(),
+        "slowdowns": 0,  # Respuestas 503 SlowDown enviadas
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def peak_rss_mb():
+    """Memoria residente máxima del proceso en MB (None si no está disponible)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(files=500, engine="s3", concurrency=1, object_size=64 * 1024, latency=0.0,
+                  missing=0, headless=True, trace_memory=False, navigation="search",
+                  executor="webdriver", capture_urls=False, verify=False, slowdown_rps=0, adaptive=True):
+    """Ejecutar una tanda completa contra el servidor falso y devolver los resultados"""
+    from aws_downloader_batch import AWSDownloaderFast
+    from s3_transfer import S3Client
+
+    keys = synthetic_keys(files)
+    served = keys[:len(keys) - missing] if missing else keys
+    server, base_url = start_fake_server(served, object_size, latency, slowdown_rps=slowdown_rps)
+
+    workdir = tempfile.mkdtemp(prefix="s3_bench_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # Aislar download_progress.jsonl y descargas del benchmark
+    try:
+        csv_path = os.path.join(workdir, "manifest.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("id;file\n")
+            for i, key in enumerate(keys, 1):
+                f.write(f"{i};{key}\n")
+
+        s3_client = S3Client(BUCKET, endpoint_url=f"{base_url}/s3") if engine == "s3" or verify else None
+        downloader = AWSDownloaderFast(
+            csv_path, os.path.join(workdir, "downloads"), batch_size=files,
+            engine=engine, s3_client=s3_client, concurrency=concurrency,
+            start_url=f"{base_url}/console", headless=headless, navigation=navigation,
+            console_bucket=BUCKET, object_url_template=f"{base_url}/console/object/{{key}}",
+            executor=executor, capture_urls=capture_urls, verify=verify, adaptive=adaptive,
+        )
+        progress = downloader.load_progress()
+        progress['total'] = len(keys)
+
+        traced_peak = None
+        if trace_memory:
+            tracemalloc.start()  # Mide asignaciones de Python, pero ralentiza la ejecución
+        start = time.perf_counter()
+        downloader.download_batch(keys, 1, 1, progress)
+        elapsed = time.perf_counter() - start
+        if downloader.verifier is not None:
+            downloader.verifier.shutdown()
+        if trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+    finally:
+        os.chdir(previous_cwd)
+        server.shutdown()
+
+    file_stats = downloader.metrics.summary().get("file_total", {})
+    return {
+        "engine": engine,
+        "files": files,
+        "concurrency": concurrency,
+        "navigation": navigation,
+        "executor": executor,
+        "capture_urls": capture_urls,
+        "verify": verify,
+        "slowdown_rps": slowdown_rps,
+        "adaptive": adaptive,
+        "peak_concurrency": downloader.controller.peak if downloader.controller else concurrency,
+        "slowdown_responses": server.config["slowdowns"],
+        "object_size": object_size,
+        "latency_ms": latency * 1000,
+        "successful": len(progress['successful_files']),
+        "failed": len(progress['failed_files']),
+        "elapsed_s": elapsed,
+        "files_per_s": files / elapsed if elapsed else 0.0,
+        "latency_p50_ms": file_stats.get("p50", 0.0) * 1000,
+        "latency_p95_ms": file_stats.get("p95", 0.0) * 1000,
+        "latency_p99_ms": file_stats.get("p99", 0.0) * 1000,
+        "python_peak_mb": traced_peak,
+        "rss_peak_mb": peak_rss_mb(),
+        "workdir": workdir,
+        "phases": downloader.metrics.summary(),
+    }
+
+
+# Módulos pesados que las rutas sin navegador no deberían cargar
+HEAVY_MODULES = ("selenium", "webdriver_manager", "pandas", "requests")
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure_import_time(module, repeat=5):
+    """Tiempo de importación de un módulo en intérpretes nuevos (mediana) y módulos pesados que arrastra"""
+    times = []
+    heavy = ""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=here, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        times.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 else ""
+    return {"module": module, "median_ms": statistics.median(times) * 1000, "heavy_loaded": heavy}
+
+
+def print_import_report(results):
+    """Imprimir los tiempos de importación"""
+    print("\n" + "=" * 60)
+    print("⏱️ TIEMPO DE IMPORTACIÓN (mediana, intérprete nuevo)")
+    for result in results:
+        heavy = result["heavy_loaded"] or "-"
+        print(f"{result['module']:<26} {result['median_ms']:8.1f} ms | pesados: {heavy}")
+    print("=" * 60)
+
+
+def print_report(result):
+    """Imprimir el resultado de un benchmark"""
+    print("\n" + "=" * 60)
+    print(f"📊 BENCHMARK ({result['engine']}, concurrencia {result['concurrency']})")
+    print(f"Archivos: {result['files']} ({result['successful']} ok, {result['failed']} fallidos)")
+    if result['slowdown_rps']:
+        mode = "adaptativa" if result['adaptive'] else "fija"
+        print(f"SlowDown: {result['slowdown_responses']} respuestas 503 | concurrencia {mode}, máximo {result['peak_concurrency']}")
+    print(f"Tiempo total: {result['elapsed_s']:.2f} s")
+    print(f"Rendimiento: {result['files_per_s']:.1f} archivos/s")
+    print(f"Latencia por archivo: p50 {result['latency_p50_ms']:.1f} ms | "
+          f"p95 {result['latency_p95_ms']:.1f} ms | p99 {result['latency_p99_ms']:.1f} ms")
+    if result['python_peak_mb'] is not None:
+        print(f"Memoria Python (pico): {result['python_peak_mb']:.1f} MB")
+    if result['rss_peak_mb'] is not None:
+        print(f"Memoria residente (pico): {result['rss_peak_mb']:.1f} MB")
+    print("=" * 60)
+
+
+def main():
+    """Benchmark offline del ciclo de descarga contra una consola y un endpoint S3 locales"""
+    parser = argparse.ArgumentParser(description="Benchmark offline del downloader (sin cuenta AWS)")
+    parser.add_argument("--files", type=int, default=500, help="Tamaño del manifiesto sintético")
+    parser.add_argument("--engine", choices=["s3", "browser"], default="s3",
+                        help="browser requiere Google Chrome instalado (se ejecuta headless)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--navigation", choices=["search", "direct"], default="search",
+                        help="Modo de navegación del motor browser")
+    parser.add_argument("--executor", choices=["webdriver", "js"], default="webdriver",
+                        help="Ejecución del flujo del motor browser")
+    parser.add_argument("--capture-urls", action="store_true",
+                        help="Motor browser: descargar las URLs prefirmadas con el pool HTTP")
+    parser.add_argument("--verify", action="store_true", help="Verificar cada descarga contra el HeadObject del endpoint local")
+    parser.add_argument("--object-size", type=int, default=64 * 1024, help="Tamaño de cada objeto en bytes")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia simulada por petición")
+    parser.add_argument("--slowdown-rps", type=int, default=0,
+                        help="GETs por segundo y prefijo que admite el endpoint antes de responder 503 SlowDown")
+    parser.add_argument("--fixed-concurrency", action="store_true", help="Desactivar el ajuste AIMD de la concurrencia")
+    parser.add_argument("--missing", type=int, default=0, help="Claves del manifiesto que no existen en el bucket")
+    parser.add_argument("--trace-memory", action="store_true", help="Medir el pico de memoria de Python con tracemalloc")
+    parser.add_argument("--show-browser", action="store_true", help="No usar Chrome headless")
+    parser.add_argument("--import-time", action="store_true",
+                        help="Medir solo el arranque: importación de los scripts y de sus dependencias pesadas")
+    parser.add_argument("--json", help="Guardar el resultado en este archivo JSON")
+    args = parser.parse_args()
+
+    if args.import_time:
+        modules = ["aws_downloader_batch", "aws_downloader", "selenium.webdriver", "webdriver_manager.chrome", "pandas"]
+        results = [measure_import_time(module) for module in modules]
+        print_import_report(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run_benchmark(args.files, args.engine, args.concurrency, args.object_size,
+                           args.latency_ms / 1000, args.missing,
+                           headless=not args.show_browser, trace_memory=args.trace_memory,
+                           navigation=args.navigation, executor=args.executor,
+                           capture_urls=args.capture_urls, verify=args.verify,
+                           slowdown_rps=args.slowdown_rps, adaptive=not args.fixed_concurrency)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
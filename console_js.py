@@ -0,0 +1,119 @@
+"""Scripts inyectados con execute_async_script para el modo de ejecución "js".
+
+Cada script resuelve en la propia página lo que con WebDriver serían varias
+peticiones (buscar elemento, limpiar, escribir, esperar, hacer clic) y
+devuelve un único resultado estructurado ``{"status": ..., ...}``. Las esperas
+fijas se sustituyen por un MutationObserver que resuelve en cuanto el
+elemento aparece en el DOM. Los enlaces y botones solo cuentan si son
+visibles y no están deshabilitados, para no pulsar restos de la página
+anterior mientras la consola navega.
+
+Estados posibles: ``opened``, ``submitted``, ``clicked``, ``no_search_box``,
+``not_found``, ``no_download_button``, ``error``.
+"""
+
+# Utilidades comunes: búsqueda por XPath y espera basada en MutationObserver
+_HELPERS = r"""
+function usable(el) {
+    return !el.disabled && el.getAttribute("aria-disabled") !== "true" && el.getClientRects().length > 0;
+}
+function firstMatch(xpaths, onlyUsable) {
+    for (const xpath of xpaths) {
+        const nodes = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < nodes.snapshotLength; i++) {
+            const el = nodes.snapshotItem(i);
+            if (!onlyUsable || usable(el)) return {el: el, xpath: xpath};
+        }
+    }
+    return null;
+}
+function waitFor(xpaths, timeoutMs, onlyUsable, ready) {
+    // `ready` (opcional) retrasa la búsqueda hasta que se cumpla, p. ej. que la URL haya cambiado
+    const find = () => (!ready || ready()) ? firstMatch(xpaths, onlyUsable) : null;
+    return new Promise(resolve => {
+        const hit = find();
+        if (hit) return resolve(hit);
+        let timer = null;
+        const observer = new MutationObserver(() => {
+            const found = find();
+            if (found) {
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(found);
+            }
+        });
+        observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+        timer = setTimeout(() => { observer.disconnect(); resolve(null); }, timeoutMs);
+    });
+}
+function clickSoon(el) {
+    // Responder a Python antes de que el clic provoque una navegación
+    setTimeout(() => el.click(), 0);
+}
+"""
+
+# Escribir el nombre en el buscador, lanzar la búsqueda y abrir el resultado
+SEARCH_AND_OPEN = _HELPERS + r"""
+const [filename, searchXPaths, linkXPaths, timeoutMs, done] = arguments;
+(async () => {
+    try {
+        const box = await waitFor(searchXPaths, timeoutMs);
+        if (!box) return done({status: "no_search_box"});
+
+        const input = box.el;
+        // Los inputs controlados por React solo detectan el valor con el setter nativo
+        const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, "value").set;
+        setter.call(input, filename);
+        input.dispatchEvent(new Event("input", {bubbles: true}));
+        input.dispatchEvent(new Event("change", {bubbles: true}));
+        const enter = {key: "Enter", code: "Enter", keyCode: 13, which: 13, bubbles: true};
+        input.dispatchEvent(new KeyboardEvent("keydown", enter));
+        input.dispatchEvent(new KeyboardEvent("keyup", enter));
+
+        if (input.form && input.form.getAttribute("action")) {
+            // Búsqueda con recarga de página: el resultado se abre en un segundo script
+            done({status: "submitted", search_xpath: box.xpath});
+            setTimeout(() => input.form.requestSubmit ? input.form.requestSubmit() : input.form.submit(), 0);
+            return;
+        }
+
+        const link = await waitFor(linkXPaths, timeoutMs, true);
+        if (!link) return done({status: "not_found", search_xpath: box.xpath});
+        done({status: "opened", search_xpath: box.xpath, link_xpath: link.xpath, from_url: location.href});
+        clickSoon(link.el);
+    } catch (e) {
+        done({status: "error", message: String(e)});
+    }
+})();
+"""
+
+# Esperar el enlace del archivo en los resultados y abrirlo
+OPEN_RESULT = _HELPERS + r"""
+const [linkXPaths, timeoutMs, done] = arguments;
+(async () => {
+    try {
+        const link = await waitFor(linkXPaths, timeoutMs, true);
+        if (!link) return done({status: "not_found"});
+        done({status: "opened", link_xpath: link.xpath, from_url: location.href});
+        clickSoon(link.el);
+    } catch (e) {
+        done({status: "error", message: String(e)});
+    }
+})();
+"""
+
+# Esperar el botón de descarga en la página del objeto y pulsarlo. Con `fromUrl`
+# (la URL de los resultados) no se busca el botón hasta haber salido de esa página
+CLICK_DOWNLOAD = _HELPERS + r"""
+const [buttonXPaths, fromUrl, timeoutMs, done] = arguments;
+(async () => {
+    try {
+        const button = await waitFor(buttonXPaths, timeoutMs, true, () => !fromUrl || location.href !== fromUrl);
+        if (!button) return done({status: "no_download_button"});
+        done({status: "clicked", button_xpath: button.xpath});
+        clickSoon(button.el);
+    } catch (e) {
+        done({status: "error", message: String(e)});
+    }
+})();
+"""
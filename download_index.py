@@ -0,0 +1,115 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Marcas mínimas de un PDF completo: cabecera al inicio y %%EOF cerca del final
+PDF_HEADER = b"%PDF-"
+PDF_TRAILER = b"%%EOF"
+TRAILER_WINDOW = 1024
+
+
+def is_valid_download(path, size):
+    """Comprobación básica de un archivo descargado: no vacío y, si es PDF, con cabecera y %%EOF"""
+    if size <= 0:
+        return False
+    if not path.lower().endswith(".pdf"):
+        return True
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(PDF_HEADER)) != PDF_HEADER:
+                return False
+            f.seek(max(0, size - TRAILER_WINDOW))
+            return PDF_TRAILER in f.read()
+    except OSError:
+        return False
+
+
+class DownloadIndex:
+    """Índice persistente de los archivos de la carpeta de descargas.
+
+    Guarda nombre, tamaño, mtime y validez de cada archivo. Si la fecha de
+    modificación de la carpeta no cambió desde la última vez, el índice se
+    usa tal cual sin recorrerla. Si cambió (se añadieron, borraron o
+    renombraron archivos) se recorre con os.scandir y solo se examinan los
+    nombres nuevos o con otro inodo, tamaño o mtime (un archivo descargado de
+    nuevo llega renombrado desde `.crdownload`/`.part` y puede reutilizar el
+    inodo del anterior); los que desaparecieron se eliminan del índice.
+
+    El índice se guarda fuera de la carpeta para que escribirlo no cambie la
+    fecha de modificación que se usa para detectar cambios.
+    """
+
+    def __init__(self, folder, path="download_index.json", suffix=".pdf"):
+        self.folder = folder
+        self.path = path
+        self.suffix = suffix
+        self.dir_mtime_ns = None
+        self.files = {}  # nombre -> [tamaño, mtime_ns, inodo, válido]
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if data.get("folder") != os.path.abspath(self.folder):
+            return  # Índice de otra carpeta: se reconstruye
+        self.dir_mtime_ns = data.get("dir_mtime_ns")
+        self.files = data.get("files", {})
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "folder": os.path.abspath(self.folder),
+                "dir_mtime_ns": self.dir_mtime_ns,
+                "files": self.files,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self):
+        """Actualizar el índice con los cambios de la carpeta; devuelve el número de archivos examinados"""
+        try:
+            dir_mtime_ns = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            self.files = {}
+            self.dir_mtime_ns = None
+            return 0
+        if dir_mtime_ns == self.dir_mtime_ns:
+            return 0
+
+        present = set()
+        examined = 0
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix) or not entry.is_file():
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                signature = [stat.st_size, stat.st_mtime_ns, entry.inode()]  # En Windows stat() no trae st_ino
+                known = self.files.get(entry.name)
+                if known and known[:3] == signature:
+                    continue  # Mismo archivo que en la última pasada
+                self.files[entry.name] = signature + [is_valid_download(entry.path, stat.st_size)]
+                examined += 1
+
+        for name in [name for name in self.files if name not in present]:
+            del self.files[name]
+
+        self.dir_mtime_ns = dir_mtime_ns  # Fecha tomada antes de recorrer: un cambio concurrente fuerza otra pasada
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar el índice de descargas: {e}")
+        return examined
+
+    def valid_files(self):
+        """Nombres de los archivos completos"""
+        return {name for name, (*_, valid) in self.files.items() if valid}
+
+    def invalid_files(self):
+        """Nombres de los archivos vacíos o truncados"""
+        return {name for name, (*_, valid) in self.files.items() if not valid}
@@ -0,0 +1,121 @@
+import os
+import time
+import logging
+import threading
+
+from error_codes import ERROR_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIX = ".crdownload"
+
+
+class DownloadTracker:
+    """Seguimiento de las descargas de Chrome en una carpeta.
+
+    Después de hacer clic en "Descargar" se registra el archivo esperado con
+    `expect`; `poll` consulta solo los nombres esperados (el archivo final y
+    su `.crdownload`, un os.stat por nombre, sin recorrer la carpeta) y
+    devuelve los archivos que terminaron (existe el archivo final, sin
+    `.crdownload`) o que superaron el tiempo límite. Si el `.crdownload` deja
+    de crecer durante `stall_timeout` segundos la descarga se da por atascada.
+    """
+
+    def __init__(self, folder, timeout=300, stall_timeout=60):
+        self.folder = folder
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self._pending = {}  # archivo -> {'started', 'last_change', 'partial_size'}
+        self._lock = threading.Lock()
+
+    def _size(self, name):
+        """Tamaño de un archivo de la carpeta (None si no existe)"""
+        try:
+            return os.stat(os.path.join(self.folder, name)).st_size
+        except OSError:
+            return None
+
+    def _sizes(self, filename):
+        """(tamaño del archivo final, tamaño del `.crdownload`), None donde no existen"""
+        return self._size(filename), self._size(filename + PARTIAL_SUFFIX)
+
+    def expect(self, filename):
+        """Registrar una descarga recién solicitada"""
+        now = time.time()
+        with self._lock:
+            self._pending[filename] = {'started': now, 'last_change': now, 'partial_size': -1}
+
+    def discard(self, filename):
+        """Olvidar una descarga esperada que finalmente no se solicitó"""
+        with self._lock:
+            self._pending.pop(filename, None)
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait_handoff(self, filename, timeout=5.0):
+        """Esperar (con backoff) a que Chrome empiece a escribir el archivo.
+
+        Devuelve True en cuanto aparece el archivo final o su `.crdownload`,
+        de modo que el navegador puede seguir con el siguiente archivo sin
+        esperar a que termine la transferencia.
+        """
+        deadline = time.time() + timeout
+        delay = 0.05
+        while True:
+            if any(size is not None for size in self._sizes(filename)):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def poll(self):
+        """Devolver [(archivo, éxito, error, duración)] de las descargas que ya se resolvieron"""
+        with self._lock:
+            if not self._pending:
+                return []
+            pending = dict(self._pending)
+
+        now = time.time()
+        resolved = []
+
+        for filename, info in pending.items():
+            final_size, partial_size = self._sizes(filename)
+            if final_size and partial_size is None:
+                resolved.append((filename, True, None, now - info['started']))
+                continue
+
+            if partial_size is not None and partial_size != info['partial_size']:
+                info['partial_size'] = partial_size
+                info['last_change'] = now
+
+            if now - info['started'] > self.timeout or now - info['last_change'] > self.stall_timeout:
+                resolved.append((filename, False, ERROR_TIMEOUT, now - info['started']))
+
+        with self._lock:
+            for filename, *_ in resolved:
+                self._pending.pop(filename, None)
+        return resolved
+
+    def wait_all(self, timeout=None):
+        """Esperar (con backoff) hasta resolver todas las descargas pendientes"""
+        deadline = time.time() + (timeout if timeout is not None else self.timeout)
+        delay = 0.1
+        resolved = []
+        while self.pending_count:
+            resolved.extend(self.poll())
+            if not self.pending_count:
+                break
+            if time.time() >= deadline:
+                with self._lock:
+                    now = time.time()
+                    for filename, info in self._pending.items():
+                        resolved.append((filename, False, ERROR_TIMEOUT, now - info['started']))
+                    self._pending.clear()
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        return resolved
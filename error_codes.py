@@ -0,0 +1,13 @@
+# Códigos de error por archivo (se guardan como last_error en el estado)
+ERROR_NOT_FOUND = "not_found"
+ERROR_SEARCH_BOX = "search_box_missing"
+ERROR_NO_DOWNLOAD_BUTTON = "no_download_button"
+ERROR_TIMEOUT = "timeout"
+ERROR_THROTTLED = "throttled"
+ERROR_UNKNOWN = "error"
+ERROR_INVALID_FILE = "invalid_file"  # Archivo en disco vacío o truncado
+
+# Resultados de la verificación de integridad (--verify)
+ERROR_SIZE_MISMATCH = "size_mismatch"
+ERROR_CHECKSUM_MISMATCH = "checksum_mismatch"
+ERROR_UNVERIFIABLE = "unverifiable"  # Tamaño correcto, pero el ETag no permite comprobar el contenido
@@ -0,0 +1,183 @@
+import io
+import os
+import csv
+import gzip
+import json
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+
+from manifest_reader import ManifestError
+
+# Columnas del fileSchema de S3 Inventory (CSV) y su nombre en Parquet
+CSV_COLUMNS = {"Key": "key", "Size": "size", "LastModifiedDate": "last_modified_date", "ETag": "e_tag",
+               "IsLatest": "is_latest", "IsDeleteMarker": "is_delete_marker"}
+PARQUET_BATCH_ROWS = 65536
+
+
+def parse_date(value):
+    """Fecha ISO (con 'Z' o sin zona, que se toma como UTC) a datetime con zona"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class InventoryFilter:
+    """Filtro de filas del inventario por prefijo, tamaño y fecha de modificación"""
+
+    def __init__(self, prefix="", min_size=None, max_size=None, modified_since=None, modified_before=None):
+        self.prefix = prefix
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_since = parse_date(modified_since) if modified_since else None
+        self.modified_before = parse_date(modified_before) if modified_before else None
+
+    def __call__(self, row):
+        if not row["key"].startswith(self.prefix):
+            return False
+        if self.min_size is not None and row["size"] < self.min_size:
+            return False
+        if self.max_size is not None and row["size"] > self.max_size:
+            return False
+        if self.modified_since or self.modified_before:
+            if not row["last_modified"]:
+                return False
+            modified = parse_date(row["last_modified"])
+            if self.modified_since and modified < self.modified_since:
+                return False
+            if self.modified_before and modified >= self.modified_before:
+                return False
+        return True
+
+
+class InventorySource:
+    """Informe de S3 Inventory (manifest.json + archivos de datos), local o en `s3://bucket/ruta/manifest.json`.
+
+    En S3 los archivos de datos se leen del bucket de destino del informe;
+    en local se buscan junto al manifiesto con la estructura que deja
+    `aws s3 sync` (`<config>/<fecha>/manifest.json` y `<config>/data/...`).
+    """
+
+    def __init__(self, location, client_factory=None):
+        self.location = location
+        self.client_factory = client_factory  # bucket -> S3Client (solo para s3://)
+        self._clients = {}
+        if location.startswith("s3://"):
+            bucket, _, key = location[len("s3://"):].partition("/")
+            try:
+                self.manifest = json.loads(self._get(bucket, key).content)
+            except ManifestError:
+                raise
+            except Exception as e:
+                raise ManifestError(f"No se pudo leer el manifiesto de inventario {location}: {e}")
+        else:
+            try:
+                with open(location, "r", encoding="utf-8") as f:
+                    self.manifest = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                raise ManifestError(f"No se pudo leer el manifiesto de inventario {location}: {e}")
+        self.file_format = self.manifest.get("fileFormat", "CSV").upper()
+        if self.file_format not in ("CSV", "PARQUET"):
+            raise ManifestError(f"Formato de inventario no soportado: {self.file_format} (solo CSV y Parquet)")
+
+    @property
+    def signature(self):
+        """Identifica este informe (cada inventario diario tiene su propio creationTimestamp)"""
+        return f"inventory:{self.location}:{self.manifest.get('creationTimestamp', '')}"
+
+    def _client(self, bucket):
+        if self.client_factory is None:
+            raise ManifestError("Leer un inventario desde s3:// requiere credenciales de AWS")
+        if bucket not in self._clients:
+            self._clients[bucket] = self.client_factory(bucket)
+        return self._clients[bucket]
+
+    def _get(self, bucket, key):
+        return self._client(bucket).request("GET", key, stream=True)
+
+    def _destination_bucket(self):
+        destination = self.manifest.get("destinationBucket", "")
+        return destination.rpartition(":")[2]  # arn:aws:s3:::bucket -> bucket
+
+    def _local_path(self, key):
+        manifest_dir = os.path.dirname(os.path.abspath(self.location))
+        data_key = key[key.index("data/"):] if "data/" in key else os.path.basename(key)
+        candidates = [
+            os.path.join(manifest_dir, key),
+            os.path.join(os.path.dirname(manifest_dir), data_key),
+            os.path.join(manifest_dir, data_key),
+            os.path.join(manifest_dir, os.path.basename(key)),
+        ]
+        for path in candidates:
+            if os.path.exists(path):
+                return path
+        raise ManifestError(f"No se encontró el archivo de datos del inventario {key} (buscado en {candidates[1]})")
+
+    def _csv_rows(self, key):
+        columns = [name.strip() for name in self.manifest.get("fileSchema", "").split(",")]
+        index = {CSV_COLUMNS[name]: i for i, name in enumerate(columns) if name in CSV_COLUMNS}
+        if "key" not in index:
+            raise ManifestError(f"El fileSchema del inventario no tiene la columna Key: {columns}")
+
+        if self.location.startswith("s3://"):
+            response = self._get(self._destination_bucket(), key)
+            stream = gzip.GzipFile(fileobj=response.raw)
+        else:
+            response = None
+            stream = gzip.open(self._local_path(key), "rb")
+        try:
+            for values in csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline="")):
+                yield {name: values[i] if i < len(values) else "" for name, i in index.items()}
+        finally:
+            stream.close()
+            if response is not None:
+                response.close()
+
+    def _parquet_rows(self, key):
+        try:
+            import pyarrow.parquet as pq  # Opcional: solo para inventarios en Parquet
+        except ImportError:
+            raise ManifestError("Los inventarios en Parquet requieren pyarrow (pip install pyarrow)")
+
+        tmp_path = None
+        if self.location.startswith("s3://"):
+            # Parquet necesita acceso aleatorio: el archivo de datos se baja entero a un temporal
+            fd, tmp_path = tempfile.mkstemp(suffix=".parquet")
+            os.close(fd)
+            self._client(self._destination_bucket()).download_object(key, tmp_path)
+            path = tmp_path
+        else:
+            path = self._local_path(key)
+        try:
+            parquet = pq.ParquetFile(path)
+            columns = [name for name in CSV_COLUMNS.values() if name in parquet.schema_arrow.names]
+            for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=columns):
+                yield from batch.to_pylist()
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def rows(self, row_filter=None):
+        """Recorrer las filas del inventario como {'key', 'size', 'etag', 'last_modified'}, archivo por archivo.
+
+        Se omiten las marcas de borrado y las versiones no actuales (inventarios
+        con versiones). En CSV las claves vienen codificadas como formulario URL (espacio = `+`).
+        """
+        reader = self._parquet_rows if self.file_format == "PARQUET" else self._csv_rows
+        for data_file in self.manifest.get("files", []):
+            for raw in reader(data_file["key"]):
+                if str(raw.get("is_delete_marker", "")).lower() == "true":
+                    continue
+                if str(raw.get("is_latest", "true")).lower() == "false":
+                    continue
+                modified = raw.get("last_modified_date")
+                row = {
+                    "key": unquote_plus(raw["key"]) if self.file_format == "CSV" else raw["key"],
+                    "size": int(raw.get("size") or 0),
+                    "etag": (raw.get("e_tag") or "").strip('"'),
+                    "last_modified": modified.isoformat() if isinstance(modified, datetime) else modified or None,
+                }
+                if row_filter is None or row_filter(row):
+                    yield row
@@ -0,0 +1,163 @@
+import os
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_leases_owner ON leases(owner);
+"""
+
+QUERY_CHUNK = 500  # Límite de parámetros por consulta IN (...)
+
+
+def shard_of(key, count):
+    """Partición de una clave entre `count` nodos (hash estable entre procesos y máquinas)"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def parse_shard(value):
+    """'i/N' -> (i, N), con 0 <= i < N"""
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Formato de shard inválido: {value!r} (se espera i/N, p. ej. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard fuera de rango: {value!r} (se espera 0 <= i < N)")
+    return index, count
+
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseStore:
+    """Reparto de claves entre nodos con leases en una base SQLite compartida.
+
+    Cada nodo reclama (`claim`) las claves que va a descargar; una clave se
+    puede reclamar si nadie la tiene, si su lease caducó o si ya era del
+    mismo nodo, y nunca si otro nodo la terminó. Mientras el nodo está vivo
+    un hilo renueva sus leases cada `ttl / 3` segundos; si el nodo se cae,
+    sus leases caducan a los `ttl` segundos y otro nodo las recupera.
+
+    La base puede estar en almacenamiento compartido (NFS, SMB): se usa el
+    journal clásico de SQLite (WAL necesita memoria compartida local) y cada
+    reclamo es una transacción `BEGIN IMMEDIATE` con el bloqueo de archivo.
+    """
+
+    def __init__(self, path, owner=None, ttl=600):
+        self.path = path
+        self.owner = owner or default_node_id()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_loop, daemon=True)
+        self._heartbeat.start()
+
+    def _transaction(self, statements):
+        """Ejecutar [(sql, parámetros o lista de parámetros)] en una sola transacción con bloqueo de escritura"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                results = []
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        self.conn.executemany(sql, params)
+                        results.append(None)
+                    else:
+                        results.append(self.conn.execute(sql, params).fetchall())
+                self.conn.execute("COMMIT")
+                return results
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, keys):
+        """Reclamar las claves disponibles; devuelve las que quedaron para este nodo (en el mismo orden)"""
+        if not keys:
+            return []
+        now = time.time()
+        expires = now + self.ttl
+        _, claimed = self._transaction([
+            ("INSERT INTO leases (key, owner, expires, updated_at) VALUES (?, ?, ?, ?) "
+             "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires, "
+             "updated_at = excluded.updated_at "
+             "WHERE leases.done = 0 AND (leases.expires < ? OR leases.owner = excluded.owner)",
+             [(key, self.owner, expires, now, now) for key in keys]),
+            ("SELECT key FROM leases WHERE owner = ? AND expires = ? AND done = 0", (self.owner, expires)),
+        ])
+        claimed = {row[0] for row in claimed}
+        return [key for key in keys if key in claimed]
+
+    def complete(self, key, done):
+        """Cerrar el lease de una clave: terminada (ningún nodo la vuelve a pedir) o liberada para otro intento"""
+        if done:
+            sql = "UPDATE leases SET done = 1, owner = ?, expires = 0, updated_at = ? WHERE key = ?"
+        else:
+            sql = "UPDATE leases SET expires = 0, updated_at = ? WHERE owner = ? AND key = ? AND done = 0"
+        params = (self.owner, time.time(), key) if done else (time.time(), self.owner, key)
+        self._transaction([(sql, params)])
+
+    def renew(self):
+        """Extender los leases vigentes de este nodo"""
+        now = time.time()
+        self._transaction([("UPDATE leases SET expires = ?, updated_at = ? WHERE owner = ? AND done = 0 AND expires > 0",
+                            (now + self.ttl, now, self.owner))])
+
+    def release_all(self):
+        """Liberar los leases que este nodo no terminó (al salir)"""
+        self._transaction([("UPDATE leases SET expires = 0 WHERE owner = ? AND done = 0", (self.owner,))])
+
+    def unfinished(self, keys):
+        """Claves de `keys` que ningún nodo terminó todavía"""
+        done = set()
+        with self._lock:
+            for start in range(0, len(keys), QUERY_CHUNK):
+                chunk = keys[start:start + QUERY_CHUNK]
+                rows = self.conn.execute(
+                    f"SELECT key FROM leases WHERE done = 1 AND key IN ({','.join('?' * len(chunk))})", chunk)
+                done.update(row[0] for row in rows)
+        return [key for key in keys if key not in done]
+
+    def summary(self):
+        """{'done': terminadas, 'active': {nodo: leases vigentes}, 'expired': leases caducados sin terminar}"""
+        now = time.time()
+        with self._lock:
+            done = self.conn.execute("SELECT COUNT(*) FROM leases WHERE done = 1").fetchone()[0]
+            active = dict(self.conn.execute(
+                "SELECT owner, COUNT(*) FROM leases WHERE done = 0 AND expires >= ? GROUP BY owner", (now,)).fetchall())
+            expired = self.conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE done = 0 AND expires < ?", (now,)).fetchone()[0]
+        return {"done": done, "active": active, "expired": expired}
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ No se pudieron renovar los leases: {e}")
+
+    def close(self):
+        """Detener la renovación, liberar lo pendiente y cerrar la conexión"""
+        self._stop.set()
+        try:
+            self.release_all()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ No se pudieron liberar los leases: {e}")
+        self.conn.close()
@@ -0,0 +1,111 @@
+import os
+import csv
+import zlib
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Caché binaria: cabecera (firma, mtime_ns, tamaño) + claves separadas por \0 comprimidas con zlib
+CACHE_MAGIC = b"MKC1"
+CACHE_HEADER = struct.Struct("<4sqq")
+
+
+class ManifestError(Exception):
+    """El manifiesto no se puede leer o no tiene la columna de claves"""
+
+
+def detect_separator(first_line):
+    """Separador del CSV a partir de la cabecera (';' si predomina sobre ',')"""
+    if ';' in first_line and first_line.count(';') > first_line.count(','):
+        return ';'
+    return ','
+
+
+def _iter_csv_rows(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        separator = detect_separator(f.readline())
+        f.seek(0)
+        logger.info(f"🔍 Detectado separador: {'punto y coma (;)' if separator == ';' else 'coma (,)'}")
+        yield from csv.reader(f, delimiter=separator)
+
+
+def _iter_excel_rows(path):
+    from openpyxl import load_workbook  # Solo se importa para manifiestos Excel
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_manifest_keys(path, column="file"):
+    """Recorrer las claves del manifiesto (CSV o Excel) sin cargarlo entero.
+
+    Las filas se leen de una en una; las claves vacías se ignoran y las
+    repetidas se descartan conservando el orden de la primera aparición, así
+    que la memoria crece con las claves únicas y no con el tamaño del archivo.
+    """
+    rows = _iter_csv_rows(path) if path.lower().endswith(".csv") else _iter_excel_rows(path)
+    header = [name.strip() for name in next(rows, [])]
+    if column not in header:
+        raise ManifestError(f"No se encontró la columna '{column}'. Columnas disponibles: {header}")
+    index = header.index(column)
+
+    seen = set()
+    for row in rows:
+        if len(row) <= index:
+            continue
+        key = row[index].strip()
+        if key and key not in seen:
+            seen.add(key)
+            yield key
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_cache(cache_path, signature):
+    try:
+        with open(cache_path, "rb") as f:
+            magic, mtime_ns, size = CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))
+            if magic != CACHE_MAGIC or (mtime_ns, size) != signature:
+                return None
+            data = zlib.decompress(f.read()).decode("utf-8")
+    except (OSError, struct.error, zlib.error, UnicodeDecodeError):
+        return None
+    return data.split("\0") if data else []
+
+
+def _write_cache(cache_path, signature, keys):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, *signature))
+        f.write(zlib.compress("\0".join(keys).encode("utf-8")))
+    os.replace(tmp_path, cache_path)
+
+
+def load_manifest_keys(path, column="file", cache_path=None):
+    """Lista de claves únicas del manifiesto, usando la caché binaria si el archivo no cambió.
+
+    La caché (por defecto `<manifiesto>.keys`) se invalida cuando cambia la
+    fecha de modificación o el tamaño del manifiesto.
+    """
+    cache_path = cache_path or path + ".keys"
+    signature = _signature(path)
+
+    keys = _read_cache(cache_path, signature)
+    if keys is not None:
+        logger.info(f"⚡ Manifiesto cargado desde la caché {cache_path}")
+        return keys
+
+    keys = list(iter_manifest_keys(path, column))
+    try:
+        _write_cache(cache_path, signature, keys)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo guardar la caché del manifiesto: {e}")
+    return keys
@@ -0,0 +1,96 @@
+import os
+import csv
+import math
+import time
+import threading
+from collections import defaultdict
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values, q):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class PhaseTimer:
+    """Cronómetro por archivo: cada `lap` registra el tiempo desde la vuelta anterior"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.metrics.record(phase, now - self._last)
+        self._last = now
+
+
+class PhaseMetrics:
+    """Latencias por fase del ciclo de descarga con exportación a CSV o Prometheus"""
+
+    def __init__(self):
+        self._samples = defaultdict(list)  # fase -> [segundos]
+        self._lock = threading.Lock()
+
+    def timer(self):
+        """Iniciar un cronómetro de fases para un archivo"""
+        return PhaseTimer(self)
+
+    def record(self, phase, seconds):
+        with self._lock:
+            self._samples[phase].append(seconds)
+
+    def summary(self):
+        """{fase: {'count', 'sum', 'mean', 'p50', 'p95', 'p99'}}"""
+        with self._lock:
+            samples = {phase: sorted(values) for phase, values in self._samples.items()}
+
+        result = {}
+        for phase, values in samples.items():
+            total = sum(values)
+            stats = {'count': len(values), 'sum': total, 'mean': total / len(values)}
+            for q in QUANTILES:
+                stats[f"p{int(q * 100)}"] = percentile(values, q)
+            result[phase] = stats
+        return result
+
+    def write_csv(self, path):
+        """Exportar el resumen por fase a CSV"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["phase", "count", "mean", "p50", "p95", "p99", "sum"])
+            for phase, stats in self.summary().items():
+                writer.writerow([phase, stats['count'], f"{stats['mean']:.4f}", f"{stats['p50']:.4f}",
+                                 f"{stats['p95']:.4f}", f"{stats['p99']:.4f}", f"{stats['sum']:.4f}"])
+
+    def write_prometheus(self, path, metric="s3_downloader_phase_seconds"):
+        """Exportar en formato textfile de Prometheus (node_exporter textfile collector)"""
+        lines = [
+            f"# HELP {metric} Duración de cada fase de descarga por archivo",
+            f"# TYPE {metric} summary",
+        ]
+        for phase, stats in self.summary().items():
+            for q in QUANTILES:
+                lines.append(f'{metric}{{phase="{phase}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'{metric}_sum{{phase="{phase}"}} {stats["sum"]:.6f}')
+            lines.append(f'{metric}_count{{phase="{phase}"}} {stats["count"]}')
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)  # El collector nunca lee un archivo a medias
+
+    def print_summary(self):
+        """Imprimir tabla de percentiles por fase"""
+        summary = self.summary()
+        if not summary:
+            return
+        print("\n⏱️ LATENCIA POR FASE (segundos):")
+        print(f"{'fase':<26}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'total':>11}")
+        for phase, stats in sorted(summary.items(), key=lambda item: -item[1]['sum']):
+            print(f"{phase:<26}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}"
+                  f"{stats['p99']:>9.2f}{stats['sum']:>11.1f}")
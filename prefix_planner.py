@@ -0,0 +1,40 @@
+import bisect
+
+
+def count_prefix(sorted_keys, prefix):
+    """Número de claves de `sorted_keys` (ordenadas) que empiezan por `prefix`"""
+    start = bisect.bisect_left(sorted_keys, prefix)
+    return bisect.bisect_left(sorted_keys, prefix + "\U0010ffff", start) - start
+
+
+def plan_prefix_groups(keys, prefix_length=20, max_group=30, known_keys=None):
+    """Agrupar claves por prefijo común para buscar cada prefijo una sola vez.
+
+    Los nombres del manifiesto son base64 de "<registro><fecha hora>..." y
+    comparten prefijos largos. Las claves se agrupan por sus primeros
+    `prefix_length` caracteres; si un prefijo coincide con más de `max_group`
+    objetos (lo que cabe en una página de resultados de la consola) se vuelve
+    a dividir con un prefijo más largo. La búsqueda también devuelve los
+    objetos ya descargados, así que con `known_keys` (todas las claves
+    conocidas del bucket, ordenadas) se cuentan esas y no solo las
+    pendientes. Devuelve [(texto a buscar, [claves])]; para un grupo de una
+    sola clave el texto a buscar es la propia clave.
+    """
+    groups = []
+
+    def split(members, length):
+        buckets = {}
+        for key in members:
+            buckets.setdefault(key[:length], []).append(key)
+
+        for prefix, bucket in buckets.items():
+            matches = len(bucket) if known_keys is None else max(len(bucket), count_prefix(known_keys, prefix))
+            if matches > max_group and length < min(len(key) for key in bucket):
+                split(bucket, length + 4)
+                continue
+            for start in range(0, len(bucket), max_group):
+                chunk = bucket[start:start + max_group]
+                groups.append((prefix if len(chunk) > 1 else chunk[0], chunk))
+
+    split(sorted(keys), prefix_length)
+    return groups
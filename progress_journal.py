@@ -0,0 +1,158 @@
+import os
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressJournal:
+    """Diario de progreso append-only en formato JSON Lines.
+
+    Cada resultado de archivo se añade como una línea independiente, así que
+    guardar progreso cuesta O(1) sin importar cuántos archivos lleve la
+    ejecución. Tipos de registro:
+
+    - ``snapshot``: estado completo compactado (siempre la primera línea)
+    - ``file``: resultado de un archivo (``ok`` verdadero o falso)
+    - ``meta``: contadores de la ejecución (completados, tanda actual...)
+
+    Si el proceso muere a mitad de una escritura solo se pierde la última
+    línea, que se descarta al cargar.
+
+    Los éxitos anteriores a la confirmación en disco (migrados de
+    download_progress.json o escritos sin ``confirmed``) se registraban al
+    hacer clic: quedan en ``unconfirmed`` y solo cuentan como terminados si
+    el archivo está en la carpeta.
+    """
+
+    META_FIELDS = ("completed", "total", "current_batch", "last_processed_file", "start_time", "last_update")
+    VERSION = 2  # Desde la versión 2 los snapshots distinguen los éxitos sin confirmar
+
+    def __init__(self, path="download_progress.jsonl", legacy_path=None, compact_every=5000):
+        self.path = path
+        self.legacy_path = legacy_path  # download_progress.json de versiones anteriores
+        self.compact_every = compact_every
+        self.file_status = {}  # archivo -> True (exitoso) / False (fallido)
+        self.unconfirmed = set()  # Éxitos registrados sin confirmar el archivo en disco
+        self._records_since_compact = 0
+        self._handle = None
+
+    def _append(self, record):
+        """Añadir una línea al diario y vaciar el buffer inmediatamente"""
+        if self._handle is None:
+            self._handle = open(self.path, "a", encoding="utf-8")
+        self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._handle.flush()
+
+    def _read_records(self):
+        """Leer los registros válidos del diario (ignorando una última línea truncada)"""
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ Línea {line_number} del diario de progreso corrupta, se ignora")
+        return records
+
+    def _apply(self, progress, record):
+        """Aplicar un registro del diario sobre el estado en memoria"""
+        kind = record.get("t")
+        if kind == "snapshot":
+            for field in self.META_FIELDS:
+                if field in record:
+                    progress[field] = record[field]
+            self.file_status = {f: True for f in record.get("successful_files", [])}
+            for f in record.get("failed_files", []):
+                self.file_status.setdefault(f, False)
+            if record.get("version", 1) >= 2:
+                self.unconfirmed = set(record.get("unconfirmed_files", []))
+            else:
+                self.unconfirmed = {f for f, ok in self.file_status.items() if ok}
+        elif kind == "file":
+            self.file_status.pop(record["file"], None)  # Mantener el orden del último resultado
+            self.file_status[record["file"]] = record["ok"]
+            if record["ok"] and not record.get("confirmed"):
+                self.unconfirmed.add(record["file"])
+            else:
+                self.unconfirmed.discard(record["file"])
+        elif kind == "meta":
+            for field in self.META_FIELDS:
+                if field in record:
+                    progress[field] = record[field]
+
+    def _status_lists(self, progress):
+        """Reconstruir las listas de exitosos y fallidos a partir del estado por archivo"""
+        progress["successful_files"] = [f for f, ok in self.file_status.items() if ok]
+        progress["failed_files"] = [f for f, ok in self.file_status.items() if not ok]
+
+    def load(self):
+        """Cargar el progreso compactando el diario; None si no hay progreso previo"""
+        progress = {}
+
+        if os.path.exists(self.path):
+            for record in self._read_records():
+                self._apply(progress, record)
+        elif self.legacy_path and os.path.exists(self.legacy_path):
+            logger.info(f"🔄 Migrando progreso de {self.legacy_path} al diario {self.path}")
+            with open(self.legacy_path, "r") as f:
+                legacy = json.load(f)
+            self._apply(progress, dict(legacy, t="snapshot"))
+        else:
+            return None
+
+        self._status_lists(progress)
+        self.compact(progress)
+        return progress
+
+    def get_status(self, filename):
+        """True si se descargó, False si falló, None si nunca se intentó"""
+        return self.file_status.get(filename)
+
+    def finished_files(self):
+        """Conjunto de archivos registrados como exitosos tras confirmarlos en disco"""
+        return {f for f, ok in self.file_status.items() if ok and f not in self.unconfirmed}
+
+    def record(self, filename, success, error=None, **details):
+        """Registrar el resultado de un archivo (una línea, O(1))"""
+        self.file_status.pop(filename, None)
+        self.file_status[filename] = success
+        record = {"t": "file", "file": filename, "ok": success, "ts": datetime.now().isoformat()}
+        if success:
+            record["confirmed"] = True  # El downloader solo registra éxitos con el archivo ya en disco
+        self.unconfirmed.discard(filename)
+        if error:
+            record["error"] = error
+        self._append(record)
+        self._records_since_compact += 1
+
+    def checkpoint(self, progress):
+        """Guardar contadores de la ejecución; compacta de vez en cuando"""
+        if self._records_since_compact >= self.compact_every:
+            self.compact(progress)
+            return
+        self._append({"t": "meta", **{k: progress.get(k) for k in self.META_FIELDS}})
+
+    def compact(self, progress):
+        """Reescribir el diario como un único snapshot (escritura atómica)"""
+        self.close()
+        snapshot = {"t": "snapshot", "version": self.VERSION, **{k: progress.get(k) for k in self.META_FIELDS}}
+        snapshot["successful_files"] = [f for f, ok in self.file_status.items() if ok]
+        snapshot["unconfirmed_files"] = [f for f, ok in self.file_status.items() if ok and f in self.unconfirmed]
+        snapshot["failed_files"] = [f for f, ok in self.file_status.items() if not ok]
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._records_since_compact = 0
+
+    def close(self):
+        """Cerrar el archivo del diario si está abierto"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
@@ -0,0 +1,171 @@
+import time
+import threading
+
+
+class AIMDController:
+    """Límite de descargas en curso ajustado con AIMD (aumento aditivo, reducción multiplicativa).
+
+    Arranca en `minimum` y, mientras las respuestas sean sanas, sube un
+    puesto por cada respuesta ("slow start", el límite se duplica en cada
+    ronda) hasta la primera señal de congestión; desde ahí sube un puesto
+    por cada ronda completa de `limit` respuestas. Un throttling
+    (`503 SlowDown`) o un timeout reduce el límite a la mitad; las señales que
+    llegan justo después de un recorte (las de peticiones que ya estaban en
+    curso) se ignoran durante un intervalo igual a la latencia media.
+
+    La latencia se sigue con una media móvil exponencial: si supera
+    `latency_tolerance` veces la mejor observada, el límite deja de subir
+    (más concurrencia solo estaría haciendo cola).
+    """
+
+    def __init__(self, maximum, minimum=1, decrease=0.5, latency_tolerance=2.0, alpha=0.2):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.alpha = alpha
+        self.limit = self.minimum
+        self.peak = self.limit
+        self.slow_start = True
+        self.latency = None  # Media móvil de la duración por archivo
+        self.best_latency = None
+        self._window = 0  # Respuestas sanas desde el último aumento
+        self._cooldown_until = 0.0
+
+    def on_success(self, duration=None):
+        """Registrar una descarga correcta; devuelve True si el límite subió"""
+        if duration is not None:
+            self.latency = duration if self.latency is None else self.alpha * duration + (1 - self.alpha) * self.latency
+            self.best_latency = self.latency if self.best_latency is None else min(self.best_latency, self.latency)
+            if self.latency > self.best_latency * self.latency_tolerance:
+                self.slow_start = False
+                self._window = 0
+                return False
+
+        if self.limit >= self.maximum:
+            return False
+        self._window += 1
+        if not self.slow_start and self._window < self.limit:
+            return False
+        self._window = 0
+        self.limit += 1
+        self.peak = max(self.peak, self.limit)
+        return True
+
+    def on_congestion(self):
+        """Registrar un throttling o timeout; devuelve True si el límite bajó"""
+        now = time.monotonic()
+        self.slow_start = False
+        self._window = 0
+        if now < self._cooldown_until:
+            return False
+        self._cooldown_until = now + max(1.0, self.latency or 0.0)
+        previous = self.limit
+        self.limit = max(self.minimum, int(self.limit * self.decrease))
+        return self.limit < previous
+
+
+class TokenBucket:
+    """Cubeta de tokens: `rate` peticiones por segundo con ráfagas de hasta `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def reserve(self):
+        """Tomar un token; devuelve los segundos que hay que esperar antes de usarlo"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def key_prefix(key, length=20):
+    """Prefijo de partición de una clave: su carpeta y los primeros `length` caracteres del nombre"""
+    folder, _, name = key.rpartition("/")
+    return f"{folder}/{name[:length]}" if folder else name[:length]
+
+
+class PrefixRateLimiter:
+    """Una cubeta de tokens por prefijo de clave, para que un prefijo caliente no provoque SlowDown.
+
+    S3 limita las peticiones por prefijo, no por bucket: repartir el ritmo
+    por prefijo deja que los prefijos fríos sigan a toda velocidad. Cada
+    throttling en un prefijo reduce su ritmo a la mitad (hasta `min_rate`) y
+    cada descarga correcta lo recupera poco a poco hasta `rate`. Con
+    `rate=None` solo se limitan los prefijos que ya recibieron un
+    throttling: su ritmo pasa a la mitad del observado en el último segundo
+    y se recupera hasta `fallback_rate`, donde se vuelve a dejar sin límite.
+    """
+
+    def __init__(self, rate=None, prefix_length=20, min_rate=1.0, fallback_rate=50.0, recovery=0.05):
+        self.rate = rate
+        self.prefix_length = prefix_length
+        self.min_rate = min_rate
+        self.fallback_rate = fallback_rate
+        self.recovery = recovery  # Fracción del ritmo máximo que se recupera por descarga correcta
+        self._buckets = {}  # prefijo -> TokenBucket
+        self._counts = {}  # prefijo -> [inicio del segundo actual, peticiones en él, peticiones en el anterior]
+        self._lock = threading.Lock()
+
+    def _ceiling(self):
+        return self.rate or self.fallback_rate
+
+    def acquire(self, key):
+        """Esperar (en el hilo que descarga) hasta que el prefijo de `key` tenga un token"""
+        prefix = key_prefix(key, self.prefix_length)
+        with self._lock:
+            self._count(prefix)
+            bucket = self._buckets.get(prefix)
+            if bucket is None:
+                if self.rate is None:
+                    return 0.0
+                bucket = self._buckets[prefix] = TokenBucket(self.rate)
+            delay = bucket.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def _count(self, prefix):
+        now = time.monotonic()
+        counter = self._counts.get(prefix)
+        if counter is None or now - counter[0] >= 2.0:
+            self._counts[prefix] = [now, 1, 0]
+        elif now - counter[0] >= 1.0:
+            counter[:] = [now, 1, counter[1]]
+        else:
+            counter[1] += 1
+
+    def _observed_rate(self, prefix):
+        """Peticiones por segundo recientes del prefijo (el mayor de los dos últimos segundos)"""
+        counter = self._counts.get(prefix)
+        if counter is None or time.monotonic() - counter[0] >= 2.0:
+            return None
+        return max(counter[1], counter[2])
+
+    def throttled(self, key):
+        """Reducir a la mitad el ritmo del prefijo de `key`; devuelve el nuevo ritmo"""
+        prefix = key_prefix(key, self.prefix_length)
+        with self._lock:
+            bucket = self._buckets.get(prefix)
+            if bucket is None:
+                bucket = self._buckets[prefix] = TokenBucket(self._ceiling())
+            observed = self._observed_rate(prefix)
+            current = bucket.rate if observed is None else min(bucket.rate, observed)
+            bucket.rate = max(self.min_rate, current / 2)
+            bucket.tokens = min(bucket.tokens, 0.0)  # Sin ráfaga justo después del throttling
+            return bucket.rate
+
+    def succeeded(self, key):
+        """Recuperar poco a poco el ritmo del prefijo de `key`"""
+        prefix = key_prefix(key, self.prefix_length)
+        with self._lock:
+            bucket = self._buckets.get(prefix)
+            if bucket is None or bucket.rate >= self._ceiling():
+                return
+            bucket.rate = min(self._ceiling(), bucket.rate + self._ceiling() * self.recovery)
+            if self.rate is None and bucket.rate >= self._ceiling():
+                del self._buckets[prefix]  # Recuperado del todo: vuelve a ir sin límite
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import heapq
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NegativeCache:
+    """Claves que S3 devolvió como inexistentes, para no volver a pedirlas en cada ejecución.
+
+    Cada clave caduca a las `ttl` segundos (por si el objeto se sube más
+    tarde). Se guarda en un JSON {clave: marca de tiempo}.
+    """
+
+    def __init__(self, path="not_found_cache.json", ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    def __contains__(self, key):
+        seen = self.entries.get(key)
+        return seen is not None and self.ttl > 0 and time.time() - seen < self.ttl
+
+    def add(self, key):
+        self.entries[key] = time.time()
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def save(self):
+        now = time.time()
+        self.entries = {k: t for k, t in self.entries.items() if now - t < self.ttl}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar la caché de no encontrados: {e}")
+
+
+class RetryScheduler:
+    """Cola de reintentos con backoff exponencial y jitter.
+
+    `schedule` decide si un fallo se reintenta (error transitorio y quedan
+    intentos) y lo programa para dentro de un tiempo aleatorio entre 0 y
+    min(max_delay, base_delay * 2^(intento-1)) ("full jitter"). `pop_due`
+    devuelve la siguiente clave cuyo tiempo ya venció, para intercalarla
+    con el trabajo nuevo.
+    """
+
+    def __init__(self, retryable_errors, max_attempts=3, base_delay=2.0, max_delay=60.0):
+        self.retryable_errors = set(retryable_errors)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = {}  # clave -> intentos fallidos en esta ejecución
+        self._heap = []  # (momento en que vence, clave)
+
+    @property
+    def pending_count(self):
+        return len(self._heap)
+
+    def schedule(self, key, error):
+        """Programar un reintento; devuelve False si el fallo es definitivo"""
+        if error not in self.retryable_errors:
+            return False
+        attempt = self.attempts.get(key, 0) + 1
+        self.attempts[key] = attempt
+        if attempt >= self.max_attempts:
+            return False
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        heapq.heappush(self._heap, (time.time() + delay, key))
+        return True
+
+    def pop_due(self):
+        """Siguiente clave lista para reintentar (None si ninguna venció todavía)"""
+        if self._heap and self._heap[0][0] <= time.time():
+            return heapq.heappop(self._heap)[1]
+        return None
+
+    def next_due_in(self):
+        """Segundos hasta el siguiente reintento (None si no hay ninguno programado)"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.time())
@@ -0,0 +1,485 @@
+import os
+import json
+import hmac
+import hashlib
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote, urlparse
+
+import requests
+
+from error_codes import ERROR_NOT_FOUND, ERROR_THROTTLED, ERROR_TIMEOUT, ERROR_UNKNOWN
+
+logger = logging.getLogger(__name__)
+
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b"").hexdigest()
+
+
+CHUNK_SIZE = 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024  # Objetos más grandes se descargan en rangos paralelos de este tamaño
+PARTIAL_SUFFIX = ".part"
+PARTIAL_META_SUFFIX = ".part.json"  # ETag, tamaño y rangos terminados de un `.part` a medias
+
+
+def _write_stream(response, path, mode="wb", offset=None, chunk_size=CHUNK_SIZE):
+    """Escribir el cuerpo de una respuesta en `path` (desde `offset` si se indica); devuelve los bytes escritos"""
+    written = 0
+    try:
+        with open(path, mode) as f:
+            if offset is not None:
+                f.seek(offset)
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+    finally:
+        response.close()
+    return written
+
+
+def _content_range(response):
+    """(último byte incluido, tamaño total) según `Content-Range: bytes a-b/total` (None si no vienen)"""
+    span, _, total = response.headers.get("Content-Range", "").partition("/")
+    end = span.rpartition("-")[2]
+    return int(end) if end.isdigit() else None, int(total) if total.isdigit() else None
+
+
+def _load_partial(dest_path):
+    try:
+        with open(dest_path + PARTIAL_META_SUFFIX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_partial(dest_path, meta):
+    tmp_path = dest_path + PARTIAL_META_SUFFIX + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, dest_path + PARTIAL_META_SUFFIX)
+
+
+def _discard_partial(dest_path):
+    for path in (dest_path + PARTIAL_SUFFIX, dest_path + PARTIAL_META_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class S3Error(Exception):
+    """Error devuelto por la API de S3 (o por un servicio compatible)"""
+
+    def __init__(self, status, code=None, message=""):
+        self.status = status
+        self.code = code
+        super().__init__(f"HTTP {status} {code or ''} {message}".strip())
+
+
+class RangedDownloader:
+    """Descargas HTTP reanudables por rangos, con rangos paralelos para objetos grandes.
+
+    La primera petición pide solo los primeros `part_size` bytes: si el
+    objeto cabe, es la descarga completa en una sola petición. Si es más
+    grande, el `.part` se reserva con su tamaño final y el resto de rangos se
+    descargan en paralelo (con `If-Match` y el ETag) mientras el hilo que
+    llamó escribe el primero. Los rangos terminados se apuntan en
+    `<archivo>.part.json` para continuar después solo con los que falten.
+
+    Si una descarga de una sola respuesta se corta, el `.part` se conserva
+    con el ETag y la siguiente vez se pide `Range: bytes=<offset>-` con
+    `If-Range`: si el objeto cambió, S3 lo devuelve entero y se empieza de
+    cero. En todos los casos el archivo final solo aparece (os.replace)
+    cuando está completo.
+
+    `fetch(headers)` envía el GET con esas cabeceras y devuelve la respuesta
+    en streaming, lanzando S3Error si no es 2xx.
+    """
+
+    def __init__(self, part_size=PART_SIZE, workers=4, chunk_size=CHUNK_SIZE):
+        self.part_size = part_size
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers)  # Rangos de todas las descargas en curso
+
+    def download(self, fetch, dest_path):
+        """Descargar a `dest_path` continuando un `.part` previo si lo hay; devuelve el tamaño"""
+        tmp_path = dest_path + PARTIAL_SUFFIX
+        meta = _load_partial(dest_path) if os.path.exists(tmp_path) else None
+        if meta is not None:
+            try:
+                if "done" in meta:
+                    return self._download_parts(fetch, dest_path, meta)
+                return self._resume_stream(fetch, dest_path, meta)
+            except S3Error as e:
+                if e.status not in (412, 416):
+                    raise
+                logger.info(f"🔄 {os.path.basename(dest_path)} cambió desde la descarga parcial: se empieza de cero")
+                _discard_partial(dest_path)
+
+        try:
+            response = fetch({"Range": f"bytes=0-{self.part_size - 1}"})
+        except S3Error as e:
+            if e.status != 416:
+                raise
+            response = fetch({})  # Objeto vacío: no admite rangos
+        etag = response.headers.get("ETag")
+        if response.status_code == 206:
+            end, total = _content_range(response)
+            if total is not None and total > self.part_size and etag:
+                meta = {"etag": etag, "size": total, "part_size": self.part_size, "done": []}
+                return self._download_parts(fetch, dest_path, meta, first_response=response)
+            if end is None or total is None or end + 1 < total:
+                # Solo llegó una parte y sin ETag no hay If-Match para unir el resto: se pide el objeto entero
+                response.close()
+                response = fetch({})
+                etag = response.headers.get("ETag")
+        return self._stream(response, dest_path, etag)
+
+    def _stream(self, response, dest_path, etag, mode="wb"):
+        """Descarga en una sola respuesta; si se corta, deja el `.part` listo para reanudar"""
+        tmp_path = dest_path + PARTIAL_SUFFIX
+        try:
+            _write_stream(response, tmp_path, mode, chunk_size=self.chunk_size)
+        except BaseException:
+            if etag and os.path.exists(tmp_path):
+                _save_partial(dest_path, {"etag": etag})
+            else:
+                _discard_partial(dest_path)  # Sin ETag no se puede comprobar que el resto sea del mismo objeto
+            raise
+        os.replace(tmp_path, dest_path)
+        if os.path.exists(dest_path + PARTIAL_META_SUFFIX):
+            os.remove(dest_path + PARTIAL_META_SUFFIX)
+        return os.path.getsize(dest_path)
+
+    def _resume_stream(self, fetch, dest_path, meta):
+        offset = os.path.getsize(dest_path + PARTIAL_SUFFIX)
+        response = fetch({"Range": f"bytes={offset}-", "If-Range": meta["etag"]})
+        if response.status_code == 206:
+            logger.info(f"⏯️ Reanudando {os.path.basename(dest_path)} desde {offset / 1024:.0f} KB")
+            return self._stream(response, dest_path, meta["etag"], mode="ab")
+        # 200: el objeto cambió (o el servidor no admite rangos) y llega entero
+        return self._stream(response, dest_path, response.headers.get("ETag"))
+
+    def _write_range(self, fetch, tmp_path, start, end, etag, response=None):
+        if response is None:
+            response = fetch({"Range": f"bytes={start}-{end}", "If-Match": etag})
+            if response.status_code != 206:
+                response.close()
+                raise S3Error(response.status_code, "RangeNotSatisfied")
+        written = _write_stream(response, tmp_path, "r+b", offset=start, chunk_size=self.chunk_size)
+        if written != end - start + 1:
+            raise IOError(f"Rango {start}-{end} incompleto ({written} bytes)")
+
+    def _download_parts(self, fetch, dest_path, meta, first_response=None):
+        tmp_path = dest_path + PARTIAL_SUFFIX
+        size, part_size = meta["size"], meta["part_size"]
+        if first_response is not None:
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+                if hasattr(os, "posix_fallocate"):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, size)
+                    except OSError:
+                        pass  # Sistema de archivos sin soporte: queda como archivo disperso
+            _save_partial(dest_path, meta)
+        else:
+            logger.info(f"⏯️ Reanudando {os.path.basename(dest_path)}: {len(meta['done'])} rangos ya descargados")
+
+        done = set(meta["done"])
+        lock = threading.Lock()
+        ranges = [(i, start, min(start + part_size, size) - 1) for i, start in enumerate(range(0, size, part_size))]
+
+        def run(index, start, end, response=None):
+            self._write_range(fetch, tmp_path, start, end, meta["etag"], response)
+            with lock:
+                done.add(index)
+                meta["done"] = sorted(done)
+                _save_partial(dest_path, meta)
+
+        futures = [self._executor.submit(run, *part) for part in ranges
+                   if part[0] not in done and not (first_response is not None and part[0] == 0)]
+        errors = []
+        if first_response is not None:
+            try:
+                run(*ranges[0], response=first_response)
+            except Exception as e:
+                errors.append(e)
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+        os.replace(tmp_path, dest_path)
+        os.remove(dest_path + PARTIAL_META_SUFFIX)
+        return size
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class S3Client:
+    """Cliente mínimo de la API de S3 (GetObject/HeadObject) con firma SigV4.
+
+    Con `endpoint_url` se usa direccionamiento por ruta (`/bucket/key`), lo que
+    permite apuntar a servicios compatibles locales (MinIO, moto, etc.).
+    Sin credenciales las peticiones se envían sin firmar (buckets públicos).
+    """
+
+    def __init__(self, bucket, region="us-east-1", endpoint_url=None,
+                 access_key=None, secret_key=None, session_token=None, timeout=30,
+                 part_size=PART_SIZE, part_workers=4):
+        self.bucket = bucket
+        self.region = region or "us-east-1"
+        self.endpoint_url = endpoint_url.rstrip("/") if endpoint_url else None
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.timeout = timeout
+        self.part_size = part_size
+        self.part_workers = part_workers
+        self._local = threading.local()
+        self._transfer = None
+        self._transfer_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, bucket, region=None, endpoint_url=None, **kwargs):
+        """Crear cliente con credenciales de las variables de entorno AWS_*"""
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
+
+        return cls(
+            bucket,
+            region=region or os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION"),
+            endpoint_url=endpoint_url or os.environ.get("AWS_ENDPOINT_URL"),
+            access_key=os.environ.get("AWS_ACCESS_KEY_ID"),
+            secret_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+            session_token=os.environ.get("AWS_SESSION_TOKEN"),
+            **kwargs
+        )
+
+    @property
+    def session(self):
+        """Sesión HTTP por hilo (conexiones keep-alive reutilizadas)"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    @property
+    def transfer(self):
+        """Descargas por rangos (el pool de rangos se crea con la primera descarga)"""
+        with self._transfer_lock:
+            if self._transfer is None:
+                self._transfer = RangedDownloader(self.part_size, self.part_workers)
+            return self._transfer
+
+    def _build_url(self, key=""):
+        """Devolver (url, host, ruta canónica) para una clave del bucket"""
+        encoded_key = quote(key, safe="/~")
+        if self.endpoint_url:
+            parsed = urlparse(self.endpoint_url)
+            path = f"{parsed.path.rstrip('/')}/{self.bucket}/{encoded_key}"
+            return f"{parsed.scheme}://{parsed.netloc}{path}", parsed.netloc, path
+
+        host = f"{self.bucket}.s3.{self.region}.amazonaws.com"
+        path = f"/{encoded_key}"
+        return f"https://{host}{path}", host, path
+
+    def _sign_headers(self, method, host, path, query=""):
+        """Calcular cabeceras de autenticación AWS Signature Version 4"""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+
+        headers = {
+            "host": host,
+            "x-amz-content-sha256": EMPTY_PAYLOAD_HASH,
+            "x-amz-date": amz_date,
+        }
+        if self.session_token:
+            headers["x-amz-security-token"] = self.session_token
+
+        signed_names = sorted(headers)
+        canonical_headers = "".join(f"{name}:{headers[name]}\n" for name in signed_names)
+        signed_headers = ";".join(signed_names)
+        canonical_request = "\n".join([
+            method, path, query, canonical_headers, signed_headers, EMPTY_PAYLOAD_HASH
+        ])
+
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+
+        def _hmac(key, msg):
+            return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+        signing_key = _hmac(("AWS4" + self.secret_key).encode("utf-8"), date_stamp)
+        for part in (self.region, "s3", "aws4_request"):
+            signing_key = _hmac(signing_key, part)
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        del headers["host"]  # requests la añade a partir de la URL
+        return headers
+
+    def request(self, method, key="", params=None, headers=None, stream=False):
+        """Enviar una petición firmada y lanzar S3Error si la respuesta no es 2xx"""
+        url, host, path = self._build_url(key)
+        query = ""
+        if params:
+            query = "&".join(
+                f"{quote(str(k), safe='-_.~')}={quote(str(v), safe='-_.~')}"
+                for k, v in sorted(params.items())
+            )
+            url = f"{url}?{query}"
+
+        request_headers = dict(headers or {})
+        if self.access_key and self.secret_key:
+            request_headers.update(self._sign_headers(method, host, path, query))
+
+        response = self.session.request(method, url, headers=request_headers,
+                                        stream=stream, timeout=self.timeout)
+        if response.status_code >= 300:
+            code = None
+            if method != "HEAD" and "<Code>" in response.text:
+                code = response.text.split("<Code>", 1)[1].split("</Code>", 1)[0]
+            response.close()
+            raise S3Error(response.status_code, code)
+        return response
+
+    def head_object(self, key):
+        """Obtener metadatos (tamaño, ETag, fecha) de un objeto"""
+        response = self.request("HEAD", key)
+        return {
+            "size": int(response.headers.get("Content-Length", 0)),
+            "etag": response.headers.get("ETag", "").strip('"'),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def list_objects(self, prefix="", page_size=1000):
+        """Recorrer ListObjectsV2 bajo `prefix`; devuelve páginas [{'key', 'size', 'etag', 'last_modified'}]"""
+        from xml.etree import ElementTree
+
+        token = None
+        while True:
+            params = {"list-type": 2, "max-keys": page_size}
+            if prefix:
+                params["prefix"] = prefix
+            if token:
+                params["continuation-token"] = token
+            response = self.request("GET", "", params=params)
+            root = ElementTree.fromstring(response.content)
+            fields = {}  # etiqueta sin espacio de nombres -> elementos
+            for element in root:
+                fields.setdefault(element.tag.rpartition("}")[2], []).append(element)
+
+            page = []
+            for item in fields.get("Contents", []):
+                values = {child.tag.rpartition("}")[2]: child.text for child in item}
+                page.append({
+                    "key": values.get("Key"),
+                    "size": int(values.get("Size") or 0),
+                    "etag": (values.get("ETag") or "").strip('"'),
+                    "last_modified": values.get("LastModified"),
+                })
+            yield page
+
+            truncated = fields.get("IsTruncated")
+            token = fields["NextContinuationToken"][0].text if "NextContinuationToken" in fields else None
+            if not truncated or truncated[0].text != "true" or not token:
+                return
+
+    def download_object(self, key, dest_path):
+        """Descargar un objeto a `dest_path` de forma atómica, por rangos y reanudando un `.part` previo"""
+        return self.transfer.download(
+            lambda headers: self.request("GET", key, headers=headers, stream=True), dest_path)
+
+
+class PresignedDownloadPool:
+    """Pool de descargas HTTP para URLs prefirmadas capturadas desde el navegador.
+
+    Cada hilo reutiliza su propia sesión keep-alive; `poll` y `wait_all`
+    devuelven [(archivo, éxito, error, duración)] con la misma forma que
+    DownloadTracker, para que el bucle de la tanda los registre igual.
+    """
+
+    def __init__(self, folder, workers=8, timeout=60, part_size=PART_SIZE, part_workers=4):
+        self.folder = folder
+        self.timeout = timeout
+        self.transfer = RangedDownloader(part_size, part_workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._local = threading.local()
+        self._futures = {}  # future -> archivo
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return len(self._futures)
+
+    def _get(self, url, headers):
+        response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        if response.status_code >= 300:
+            response.close()
+            raise S3Error(response.status_code)
+        return response
+
+    def _fetch(self, filename, url):
+        start = time.time()
+        try:
+            self.transfer.download(lambda headers: self._get(url, headers), os.path.join(self.folder, filename))
+            return filename, True, None, time.time() - start
+        except S3Error as e:
+            error = ERROR_NOT_FOUND if e.status == 404 else ERROR_THROTTLED if e.status == 503 else ERROR_UNKNOWN
+            return filename, False, error, time.time() - start
+        except requests.Timeout:
+            return filename, False, ERROR_TIMEOUT, time.time() - start
+        except Exception as e:
+            logger.warning(f"⚠️ Error descargando URL prefirmada de {filename}: {e}")
+            return filename, False, ERROR_UNKNOWN, time.time() - start
+
+    def submit(self, filename, url):
+        """Encolar la descarga de una URL prefirmada"""
+        future = self._executor.submit(self._fetch, filename, url)
+        with self._lock:
+            self._futures[future] = filename
+
+    def poll(self):
+        """Resultados de las descargas que ya terminaron"""
+        with self._lock:
+            done = [future for future in self._futures if future.done()]
+            for future in done:
+                del self._futures[future]
+        return [future.result() for future in done]
+
+    def wait_all(self, timeout=None):
+        """Esperar a que terminen todas las descargas encoladas"""
+        with self._lock:
+            futures = list(self._futures)
+            self._futures.clear()
+        return [future.result(timeout=timeout) for future in futures]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.transfer.shutdown()
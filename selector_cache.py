@@ -0,0 +1,68 @@
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SelectorResolver:
+    """Recordar qué selector funcionó para cada elemento de la consola.
+
+    Las listas de selectores (campo de búsqueda, enlace del resultado, botón
+    de descarga) se prueban en orden con una espera por cada uno; si la
+    consola está en otro idioma o cambió el diseño, cada archivo pagaba la
+    espera de los selectores que no coinciden. El resolvedor guarda el
+    selector ganador por rol, lo pone primero en las siguientes búsquedas y
+    lo persiste en `path` para las próximas ejecuciones. Solo se vuelve a
+    aprender cuando el selector guardado deja de encontrar el elemento.
+    """
+
+    def __init__(self, path="selector_cache.json"):
+        self.path = path
+        self._winners = {}  # rol -> selector (plantilla, p. ej. con {filename})
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._winners = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ No se pudo leer la caché de selectores {self.path}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._winners, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def winner(self, role, selectors):
+        """Selector aprendido para el rol (None si no hay o ya no está en la lista)"""
+        selector = self._winners.get(role)
+        return selector if selector in selectors else None
+
+    def ordered(self, role, selectors):
+        """Lista de selectores con el ganador aprendido en primer lugar"""
+        selector = self.winner(role, selectors)
+        if selector is None:
+            return list(selectors)
+        return [selector] + [s for s in selectors if s != selector]
+
+    def learn(self, role, selector):
+        """Registrar el selector que encontró el elemento (se persiste solo si cambia)"""
+        with self._lock:
+            if self._winners.get(role) == selector:
+                return
+            previous = self._winners.get(role)
+            self._winners[role] = selector
+            if previous:
+                logger.info(f"🔁 Selector de {role} reaprendido: {selector}")
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"⚠️ No se pudo guardar la caché de selectores: {e}")
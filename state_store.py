@@ -0,0 +1,244 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from error_codes import ERROR_NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_DOWNLOADED = "downloaded"
+STATUS_FAILED = "failed"
+STATUS_NOT_FOUND = "not_found"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    bytes INTEGER,
+    duration REAL,
+    checksum TEXT,
+    in_manifest INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_status ON files(status);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class StateStore:
+    """Índice de manifiesto y estado de descargas en SQLite (una fila por clave).
+
+    Implementa la misma interfaz que ProgressJournal (load/record/checkpoint/
+    get_status/finished_files) para poder usarse como backend de progreso, y
+    añade consultas indexadas por estado para ejecuciones de 100k+ claves.
+    """
+
+    def __init__(self, path="download_state.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Bases creadas antes del modo sync: añadir los metadatos remotos
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for column in ("etag", "last_modified"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} TEXT")
+        self.conn.commit()
+
+    # --- Manifiesto -------------------------------------------------------
+
+    def _get_meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, None if value is None else str(value)),
+        )
+
+    @staticmethod
+    def _manifest_signature(manifest_path):
+        stat = os.stat(manifest_path)
+        return f"{os.path.abspath(manifest_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def cached_manifest(self, manifest_path):
+        """Claves del manifiesto ya importado si el archivo no cambió; None si hay que releerlo"""
+        if self._get_meta("manifest_signature") != self._manifest_signature(manifest_path):
+            return None
+        return [row[0] for row in self.conn.execute("SELECT key FROM files WHERE in_manifest = 1 ORDER BY rowid")]
+
+    def import_manifest(self, manifest_path, keys, signature=None):
+        """Insertar las claves del manifiesto como pendientes (las existentes conservan su estado).
+
+        `signature` sustituye a la firma del archivo cuando el manifiesto no
+        es un archivo local (p. ej. un inventario de S3).
+        """
+        with self._lock:
+            self.conn.execute("UPDATE files SET in_manifest = 0")
+            self.conn.executemany(
+                "INSERT INTO files (key, status, in_manifest) VALUES (?, 'pending', 1) "
+                "ON CONFLICT(key) DO UPDATE SET in_manifest = 1",
+                ((key,) for key in keys),
+            )
+            self._set_meta("manifest_signature", signature or self._manifest_signature(manifest_path))
+            self.conn.commit()
+
+    def add_discovered(self, keys):
+        """Registrar claves encontradas en el bucket que no están en el manifiesto"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO files (key, status, in_manifest) VALUES (?, 'pending', 0) ON CONFLICT(key) DO NOTHING",
+                ((key,) for key in keys),
+            )
+            self.conn.commit()
+
+    def set_remote(self, rows, downloaded=False):
+        """Guardar los metadatos remotos [(clave, etag, tamaño, last_modified)] de la copia local.
+
+        Con `downloaded` además se marcan como descargadas (archivos ya
+        presentes en disco que coinciden con el objeto remoto).
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self.conn.executemany(
+                """
+                INSERT INTO files (key, status, bytes, etag, last_modified, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    status = CASE WHEN ? THEN 'downloaded' ELSE files.status END,
+                    bytes = excluded.bytes,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    updated_at = excluded.updated_at
+                """,
+                ((key, STATUS_DOWNLOADED if downloaded else STATUS_PENDING, size, etag, last_modified, now, downloaded)
+                 for key, etag, size, last_modified in rows),
+            )
+            self.conn.commit()
+
+    def mark_downloaded(self, keys):
+        """Marcar como descargadas las claves encontradas en disco"""
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE files SET status = 'downloaded', updated_at = ? WHERE key = ? AND status != 'downloaded'",
+                ((datetime.now().isoformat(), key) for key in keys),
+            )
+            self.conn.commit()
+
+    # --- Consultas --------------------------------------------------------
+
+    def next_pending(self, limit=500):
+        """Siguientes claves pendientes o fallidas (no incluye las no encontradas)"""
+        rows = self.conn.execute(
+            "SELECT key FROM files WHERE status IN ('pending', 'failed') ORDER BY rowid LIMIT ?", (limit,)
+        )
+        return [row[0] for row in rows]
+
+    def keys_with_status(self, status):
+        """Todas las claves con un estado dado (p. ej. 'not_found')"""
+        return [row[0] for row in self.conn.execute("SELECT key FROM files WHERE status = ? ORDER BY rowid", (status,))]
+
+    def remote_rows(self, keys, chunk_size=500):
+        """{clave: (estado, tamaño, etag, last_modified)} de las claves dadas que ya están en el índice"""
+        rows = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            cursor = self.conn.execute(
+                f"SELECT key, status, bytes, etag, last_modified FROM files WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            rows.update((row[0], row[1:]) for row in cursor)
+        return rows
+
+    def counts(self):
+        """Número de claves por estado"""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+
+    def get_row(self, key):
+        """Fila completa de una clave como diccionario (None si no existe)"""
+        cursor = self.conn.execute("SELECT * FROM files WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cursor.description], row))
+
+    # --- Interfaz de backend de progreso ---------------------------------
+
+    def get_status(self, key):
+        """True si se descargó, False si falló, None si nunca se intentó"""
+        row = self.conn.execute("SELECT status FROM files WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] == STATUS_PENDING:
+            return None
+        return row[0] == STATUS_DOWNLOADED
+
+    def finished_files(self):
+        """Conjunto de claves ya descargadas"""
+        return set(self.keys_with_status(STATUS_DOWNLOADED))
+
+    def load(self):
+        """Cargar el progreso en el formato de diccionario que usa el downloader"""
+        counts = self.counts()
+        if not counts:
+            return None
+
+        progress = {name: self._get_meta(name) for name in ("start_time", "last_processed_file", "last_update")}
+        progress['total'] = sum(counts.values())
+        progress['completed'] = counts.get(STATUS_DOWNLOADED, 0)
+        progress['current_batch'] = int(self._get_meta("current_batch") or 1)
+        progress['successful_files'] = self.keys_with_status(STATUS_DOWNLOADED)
+        progress['failed_files'] = [
+            row[0] for row in self.conn.execute(
+                "SELECT key FROM files WHERE status IN ('failed', 'not_found') ORDER BY rowid")
+        ]
+        return progress
+
+    def record(self, key, success, error=None, size=None, duration=None, checksum=None):
+        """Registrar el resultado de un intento de descarga"""
+        if success:
+            status = STATUS_DOWNLOADED
+        elif error == ERROR_NOT_FOUND:
+            status = STATUS_NOT_FOUND
+        else:
+            status = STATUS_FAILED
+
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO files (key, status, attempts, last_error, bytes, duration, checksum, updated_at)
+                VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = files.attempts + 1,
+                    last_error = excluded.last_error,
+                    bytes = COALESCE(excluded.bytes, files.bytes),
+                    duration = excluded.duration,
+                    checksum = COALESCE(excluded.checksum, files.checksum),
+                    updated_at = excluded.updated_at
+                """,
+                (key, status, error, size, duration, checksum, datetime.now().isoformat()),
+            )
+            self.conn.commit()
+
+    def checkpoint(self, progress):
+        """Guardar los metadatos de la ejecución"""
+        with self._lock:
+            for name in ("start_time", "last_processed_file", "last_update", "current_batch"):
+                self._set_meta(name, progress.get(name))
+            self.conn.commit()
+
+    def close(self):
+        """Cerrar la conexión"""
+        self.conn.close()
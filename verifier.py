@@ -0,0 +1,209 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+
+from error_codes import (ERROR_NOT_FOUND, ERROR_UNKNOWN, ERROR_SIZE_MISMATCH, ERROR_CHECKSUM_MISMATCH,
+                         ERROR_UNVERIFIABLE)
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+CHUNK_SIZE = MIB  # Los tamaños de parte candidatos son múltiplos de este bloque
+
+VERIFY_ATTEMPTS = 3  # Intentos de una verificación que falla por un error transitorio (HeadObject, lectura)
+VERIFY_RETRY_DELAY = 1.0  # Segundos antes del segundo intento; se duplica en cada uno
+
+MD5_ETAG = re.compile(r"^[0-9a-f]{32}$")
+MULTIPART_ETAG = re.compile(r"^[0-9a-f]{32}-(\d+)$")
+
+
+def multipart_part_sizes(size, parts):
+    """Tamaños de parte con los que una subida multiparte de `size` bytes da `parts` partes.
+
+    El ETag multiparte no dice qué tamaño de parte se usó: se prueban los
+    habituales (5, 8, 16, 64 MiB) y el reparto uniforme redondeado a MiB.
+    """
+    uniform = -(-size // parts)
+    candidates = {5 * MIB, 8 * MIB, 16 * MIB, 64 * MIB, -(-uniform // MIB) * MIB}
+    return sorted(ps for ps in candidates if ps > 0 and -(-size // ps) == parts)
+
+
+def file_digests(path, part_sizes=(), chunk_size=CHUNK_SIZE):
+    """MD5 del archivo y ETag multiparte para cada tamaño de parte, en una sola lectura por bloques"""
+    whole = hashlib.md5()
+    state = {ps: [hashlib.md5(), 0, []] for ps in part_sizes}  # md5 de la parte actual, bytes, digests
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            whole.update(chunk)
+            for ps, part in state.items():
+                part[0].update(chunk)
+                part[1] += len(chunk)
+                if part[1] == ps:
+                    part[2].append(part[0].digest())
+                    part[0], part[1] = hashlib.md5(), 0
+
+    etags = {}
+    for ps, (current, pending, digests) in state.items():
+        if pending:
+            digests.append(current.digest())
+        etags[ps] = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+    return whole.hexdigest(), etags
+
+
+def verify_file(path, expected_size=None, expected_etag=None):
+    """Comparar un archivo con los metadatos del objeto. Devuelve (ok, código de error, md5).
+
+    Con ETag simple se compara el MD5; con ETag multiparte (`<md5>-N`) se
+    reconstruye a partir de las partes. Si el ETag no es un MD5 (p. ej.
+    objetos cifrados con KMS) o ningún tamaño de parte habitual reproduce el
+    ETag multiparte, solo queda comprobado el tamaño: el archivo se da por
+    bueno con el código `unverifiable`, no como corrupto.
+    """
+    size = os.path.getsize(path)
+    if expected_size is not None and size != expected_size:
+        return False, ERROR_SIZE_MISMATCH, None
+
+    etag = (expected_etag or "").strip('"').lower()
+    multipart = MULTIPART_ETAG.match(etag)
+    if multipart:
+        md5, etags = file_digests(path, multipart_part_sizes(size, int(multipart.group(1))))
+        return True, None if etag in etags.values() else ERROR_UNVERIFIABLE, md5
+
+    md5, _ = file_digests(path)
+    if not MD5_ETAG.match(etag):
+        return True, ERROR_UNVERIFIABLE, md5
+    ok = md5 == etag
+    return ok, None if ok else ERROR_CHECKSUM_MISMATCH, md5
+
+
+# --- Proceso de verificación ----------------------------------------------
+
+_client = None  # S3Client propio de cada proceso del pool
+
+
+def _init_worker(client_config):
+    global _client
+    if client_config is None:
+        return  # Solo metadatos del inventario: sin HeadObject
+    from s3_transfer import S3Client
+    _client = S3Client(**client_config)
+
+
+def _verify_task(key, path, expected=None, delay=0):
+    """HeadObject + hash del archivo en un proceso del pool.
+
+    Con `expected` (tamaño, ETag del inventario) se compara primero contra
+    esos datos sin pedir nada a S3; solo si no coinciden se consulta el
+    objeto actual, que pudo cambiar después de generarse el inventario.
+    `delay` es la espera previa de un reintento.
+    """
+    from s3_transfer import S3Error
+    if delay:
+        time.sleep(delay)
+    if expected is not None:
+        try:
+            result = verify_file(path, *expected)
+        except OSError:
+            return False, ERROR_UNKNOWN, None
+        if result[0] or _client is None:
+            return result
+    try:
+        meta = _client.head_object(key)
+    except S3Error as e:
+        return False, ERROR_NOT_FOUND if e.status == 404 else ERROR_UNKNOWN, None
+    except Exception:
+        return False, ERROR_UNKNOWN, None
+    try:
+        return verify_file(path, meta["size"], meta["etag"])
+    except OSError:
+        return False, ERROR_UNKNOWN, None
+
+
+class IntegrityVerifier:
+    """Verificación de descargas en un pool de procesos (tamaño + MD5/ETag contra S3).
+
+    Cada proceso tiene su propio cliente S3 y hace el HeadObject y el hash
+    por bloques, así que el hilo principal solo encola y recoge resultados.
+    `poll` y `wait_all` devuelven [(archivo, ok, error, duración, md5)], donde
+    la duración es la de la descarga; el tiempo de verificación se registra
+    en `metrics` como fase `verify`. Sin `s3_client` solo se comparan los
+    metadatos ya conocidos (`expected` en `submit`, p. ej. de un inventario).
+    Un error transitorio (`error`) repite la verificación hasta
+    VERIFY_ATTEMPTS veces antes de devolverse, sin volver a descargar.
+    """
+
+    def __init__(self, s3_client, prefix="", workers=None, metrics=None):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.prefix = prefix
+        self.metrics = metrics
+        client_config = None if s3_client is None else {
+            "bucket": s3_client.bucket,
+            "region": s3_client.region,
+            "endpoint_url": s3_client.endpoint_url,
+            "access_key": s3_client.access_key,
+            "secret_key": s3_client.secret_key,
+            "session_token": s3_client.session_token,
+            "timeout": s3_client.timeout,
+        }
+        # spawn: el proceso principal ya tiene hilos (pool de descargas, trackers)
+        self._executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(client_config,))
+        self._futures = {}  # future -> (archivo, ruta, duración de la descarga, expected, intento, inicio)
+        self._lock = threading.Lock()
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return len(self._futures)
+
+    def submit(self, filename, path, duration=None, expected=None, attempt=1):
+        """Encolar la verificación de un archivo descargado en `path` (`expected`: tamaño y ETag ya conocidos)"""
+        delay = VERIFY_RETRY_DELAY * 2 ** (attempt - 2) if attempt > 1 else 0
+        future = self._executor.submit(_verify_task, self.prefix + filename, path, expected, delay)
+        with self._lock:
+            self._futures[future] = (filename, path, duration, expected, attempt, time.time())
+
+    def _collect(self, done):
+        """Resultados de `done`; los errores transitorios se vuelven a encolar mientras queden intentos"""
+        results = []
+        for future, (filename, path, duration, expected, attempt, started) in done:
+            ok, error, md5 = future.result()
+            if error == ERROR_UNKNOWN and attempt < VERIFY_ATTEMPTS:
+                logger.info(f"🔁 Verificación de {filename} fallida (intento {attempt}/{VERIFY_ATTEMPTS}), se repite")
+                self.submit(filename, path, duration, expected, attempt + 1)
+                continue
+            if self.metrics is not None:
+                self.metrics.record("verify", time.time() - started)
+            results.append((filename, ok, error, duration, md5))
+        return results
+
+    def poll(self):
+        """Resultados de las verificaciones que ya terminaron"""
+        with self._lock:
+            done = [(future, info) for future, info in self._futures.items() if future.done()]
+            for future, _ in done:
+                del self._futures[future]
+        return self._collect(done)
+
+    def wait_all(self):
+        """Esperar a que terminen todas las verificaciones encoladas (reintentos incluidos)"""
+        results = []
+        while True:
+            with self._lock:
+                pending = list(self._futures.items())
+                self._futures.clear()
+            if not pending:
+                return results
+            results.extend(self._collect(pending))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)